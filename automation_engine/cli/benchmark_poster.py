@@ -0,0 +1,159 @@
+﻿# benchmark_poster.py
+"""
+End-to-end posting benchmark against the local Marketplace stand-in.
+
+Creates a throwaway root (account-instances/bench_N, a DB migrated to the
+canonical schema and seeded with N listings whose images are served by the
+stand-in), posts every listing through run_concurrent with that root, the
+stand-in's URL and a headless pool, then reports listings/min and per-step p50/p90/p99 from
+posting_steps.
+
+  python benchmark_poster.py --listings 10 --accounts 2 --variant placeholder --input fast --lean
+  python benchmark_poster.py --fail-below 6 --json      # exit 1 when throughput regresses
+"""
+import argparse, asyncio, json, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+
+CLI = ROOT / "automation_engine" / "cli"
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(CLI))
+sys.path.append(str(UTILS))
+import post_campaign
+from post_campaign import database_for, run_concurrent
+from schema import migrate
+from facebook_poster_simple import SimpleFacebookPoster
+from browser_pool import BrowserContextPool
+from lean_mode import LeanProfile
+from marketplace_standin import VARIANTS, MarketplaceStandin
+from playwright_runtime import runtime
+
+CAMPAIGN_ID = 1
+
+SAMPLE_VEHICLES = [
+    ("2018", "Toyota", "Camry", "84500", "18900", "Sedan", "Silver", "Black", "Good", "Gasoline", "Automatic"),
+    ("2020", "Ford", "F-150", "61000", "34500", "Truck", "White", "Gray", "Very good", "Gasoline", "Automatic"),
+    ("2016", "Honda", "Civic", "112000", "13250", "Sedan", "Blue", "Black", "Good", "Gasoline", "Manual"),
+    ("2021", "Tesla", "Model 3", "38000", "39900", "Sedan", "Red", "White", "Excellent", "Electric", "Automatic"),
+    ("2019", "Jeep", "Wrangler", "70500", "31800", "SUV", "Green", "Black", "Very good", "Gasoline", "Manual"),
+]
+
+def seed_db(db, image_base: str, listings: int, images: int):
+    """Migrates `db` (utils/db.py Database) to the canonical schema and adds the benchmark campaign."""
+    migrate(db)
+    conn = db.connect()
+    conn.execute("INSERT INTO campaigns (id, campaign_name, status, created_at) VALUES (?,?,?,?)",
+                 (CAMPAIGN_ID, "Benchmark", "active", post_campaign.now_utc()))
+    rows = []
+    for i in range(listings):
+        y, make, model, km, price, body, ext, intr, cond, fuel, trans = SAMPLE_VEHICLES[i % len(SAMPLE_VEHICLES)]
+        urls = [f"{image_base}/images/l{i + 1}_{j + 1}.jpg" for j in range(images)]
+        rows.append((CAMPAIGN_ID, "facebook", f"{y} {make} {model}", "Car/Truck", make, model, y, km, price, body,
+                     ext, intr, cond, fuel, trans, f"Benchmark listing {i + 1}. Clean title, well maintained.",
+                     "Surrey, BC", json.dumps(urls), "pending"))
+    conn.executemany("""
+      INSERT INTO listings (campaign_id, platform, title, vehicle_type, make, model, year, mileage, price, body_style,
+                            color_ext, color_int, condition, fuel, transmission, description, location, images_json, status)
+      VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    """, rows)
+    conn.commit(); conn.close()
+
+def percentile(values: list, pct: float):
+    if not values: return None
+    s = sorted(values)
+    k = (len(s) - 1) * pct / 100
+    lo = int(k); hi = min(lo + 1, len(s) - 1)
+    return round(s[lo] + (s[hi] - s[lo]) * (k - lo), 1)
+
+def step_stats(db) -> dict:
+    conn = db.connect()
+    by_step = {}
+    for step, ms, outcome in conn.execute("SELECT step, duration_ms, outcome FROM posting_steps"):
+        e = by_step.setdefault(step, {"ms": [], "fail": 0})
+        e["ms"].append(ms or 0)
+        if outcome != "ok": e["fail"] += 1
+    conn.close()
+    return {step: {"n": len(e["ms"]), "fail": e["fail"], "p50": percentile(e["ms"], 50),
+                   "p90": percentile(e["ms"], 90), "p99": percentile(e["ms"], 99)}
+            for step, e in sorted(by_step.items())}
+
+def listing_counts(db) -> dict:
+    conn = db.connect()
+    counts = dict(conn.execute("SELECT COALESCE(status,'pending'), COUNT(*) FROM listings GROUP BY 1").fetchall())
+    conn.close()
+    return counts
+
+async def run_benchmark(args) -> dict:
+    standin = MarketplaceStandin(variant=args.variant, latency_ms=args.latency_ms, render_ms=args.render_ms,
+                                 upload_ms=args.upload_ms).start()
+    tmp = tempfile.TemporaryDirectory(prefix="crazy-poster-bench-")
+    root = Path(tmp.name)
+    db = database_for(root)  # creates shared-resources/database under the throwaway root
+    accounts = [f"bench_{i + 1}" for i in range(args.accounts)]
+    for a in accounts: (root / "account-instances" / a).mkdir(parents=True)
+    seed_db(db, standin.url, args.listings, args.images)
+
+    pool = BrowserContextPool(root, headless=True, lean=(LeanProfile() if args.lean else None))
+    try:
+        t0 = time.perf_counter()
+        await run_concurrent(accounts, CAMPAIGN_ID, limit=args.listings, attempts=1, publish=args.publish,
+                             concurrency=args.concurrency, pool=pool, input_profile=args.input,
+                             prefetch=args.prefetch, upload_mode=args.upload, root=root, base_url=standin.url)
+        elapsed = time.perf_counter() - t0
+        counts = listing_counts(db)
+        done = counts.get("posted" if args.publish else "prepared", 0)
+        return {
+            "variant": args.variant, "input": args.input, "lean": args.lean, "prefetch": args.prefetch,
+            "upload": args.upload,
+            "accounts": args.accounts,
+            "concurrency": args.concurrency, "listings": args.listings, "succeeded": done,
+            "statuses": counts, "elapsed_s": round(elapsed, 2),
+            "listings_per_min": round(done * 60 / elapsed, 2) if elapsed else 0.0,
+            "published_on_standin": standin.counters["publish"], "uploads_on_standin": standin.counters["uploads"],
+            "steps": step_stats(db),
+        }
+    finally:
+        await pool.close()
+        await runtime.shutdown()
+        db.close_all()
+        standin.stop()
+        tmp.cleanup()
+
+def print_report(r: dict):
+    print(f"\n=== Benchmark: {r['variant']} DOM, input={r['input']}, lean={r['lean']}, prefetch={r['prefetch']}, upload={r['upload']}, "
+          f"{r['accounts']} account(s), concurrency {r['concurrency']} ===")
+    print(f"{r['succeeded']}/{r['listings']} listing(s) in {r['elapsed_s']}s -> {r['listings_per_min']} listings/min")
+    print(f"Statuses: {r['statuses']}")
+    print(f"\n{'step':<32}{'n':>5}{'fail':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for step, s in r["steps"].items():
+        print(f"{step:<32}{s['n']:>5}{s['fail']:>6}{s['p50']:>10}{s['p90']:>10}{s['p99']:>10}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the poster against the offline Marketplace stand-in")
+    ap.add_argument("--listings", type=int, default=5)
+    ap.add_argument("--accounts", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=2)
+    ap.add_argument("--images", type=int, default=3, help="images per listing")
+    ap.add_argument("--variant", choices=VARIANTS, default="aria", help="composer DOM variant")
+    ap.add_argument("--latency-ms", type=int, default=50, help="added latency per page/API request")
+    ap.add_argument("--render-ms", type=int, default=150, help="delay before revealed form parts render")
+    ap.add_argument("--upload-ms", type=int, default=200, help="added latency per image upload")
+    ap.add_argument("--input", choices=SimpleFacebookPoster.INPUT_PROFILES, default="human")
+    ap.add_argument("--lean", action="store_true")
+    ap.add_argument("--prefetch", type=int, default=3, help="listings whose images are fetched ahead (0 = off)")
+    ap.add_argument("--upload", choices=post_campaign.UPLOAD_MODES, default="file")
+    ap.add_argument("--publish", action="store_true", help="go through Next/Publish as well")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("--fail-below", type=float, default=None, help="exit 1 when listings/min is below this")
+    args = ap.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    if args.json: print(json.dumps(report, indent=2))
+    else: print_report(report)
+    if args.fail_below is not None and report["listings_per_min"] < args.fail_below:
+        print(f"FAIL: {report['listings_per_min']} listings/min is below {args.fail_below}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+﻿# cache_maintenance.py
+import argparse, json, sys
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
+IMAGE_CACHE_ROOT = ROOT / "assets" / "image-cache"
+
+FB_AUTOMATION = ROOT / "automation_engine" / "facebook_automation"
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(FB_AUTOMATION))
+sys.path.append(str(UTILS))
+from image_cache import ImageCache
+from cache_manager import CacheManager, format_report
+from db import database
+
+def main():
+    ap = argparse.ArgumentParser(description="Trim the image cache and sweep old temp-images folders")
+    ap.add_argument("--budget-gb", type=float, default=10, help="evict least recently used images above this")
+    ap.add_argument("--temp-max-age-hours", type=float, default=6)
+    ap.add_argument("--report", action="store_true", help="only print cache stats, change nothing")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    cache = ImageCache(IMAGE_CACHE_ROOT)
+    if args.report:
+        r = {**cache.stats(), "budget": int(args.budget_gb * 2**30)}
+        rate = "n/a" if r["hit_rate"] is None else f"{r['hit_rate'] * 100:.1f}%"
+        print(json.dumps(r, indent=2) if args.json else
+              f"Image cache: {r['bytes'] / 2**20:.1f} MB in {r['blobs']} image(s), hit rate {rate}, "
+              f"{r['bytes_reclaimed'] / 2**20:.1f} MB reclaimed so far")
+        return
+    mgr = CacheManager(cache, database(DB_PATH), ROOT / "account-instances", budget_bytes=int(args.budget_gb * 2**30),
+                       temp_max_age=int(args.temp_max_age_hours * 3600))
+    r = mgr.run()
+    print(json.dumps(r, indent=2) if args.json else format_report(r))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+﻿# check_csv_engines.py
+import argparse, csv, io, sys
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(UTILS))
+from csv_import import REQUIRED, arrow_batches, csv_batches, pa_csv
+
+# the awkward parts of real dealer feeds: BOM, quoted commas and quotes, line breaks
+# inside descriptions, empty cells, non-ASCII text
+HEADER = REQUIRED + ["vin", "images"]
+ROWS = [
+    ["facebook", "2019 Honda Civic", "Car/Truck", "Honda", "Civic", "2019", "45,000", "$18,900",
+     "One owner.\nNo accidents, \"like new\".", "Surrey, BC", "VIN0001", "https://x/1.jpg;https://x/2.jpg"],
+    ["facebook", "2020 Škoda Octavia", "Car/Truck", "Škoda", "Octavia", "2020", "", "21500",
+     "Winter tires included.\r\n\r\nCall today!", "Montréal, QC", "VIN0002", ""],
+    ["facebook", "2015 Ford F-150", "Car/Truck", "Ford", "F-150", "2015", "120000", "15000", "", "", "VIN0003", ""],
+]
+
+def sample(copies: int) -> bytes:
+    out = io.StringIO(newline="")
+    w = csv.writer(out)
+    w.writerow(HEADER)
+    for i in range(copies):
+        for r in ROWS: w.writerow(r[:-2] + [f"{r[-2]}-{i}", r[-1]])
+    return b"\xef\xbb\xbf" + out.getvalue().encode("utf-8")
+
+def read_all(source, data: bytes, batch_size: int) -> tuple[list, list]:
+    batches = source(io.BytesIO(data), batch_size)
+    try:
+        header = list(next(batches))
+        return header, [dict(r) for batch in batches for r in batch]
+    finally:
+        batches.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Fail if the pyarrow CSV source reads different rows than the csv module")
+    ap.add_argument("--csv", type=Path, help="compare on this feed instead of the built-in sample")
+    ap.add_argument("--copies", type=int, default=2000, help="sample rows x3 (spans several arrow blocks)")
+    ap.add_argument("--batch-size", type=int, default=500)
+    args = ap.parse_args()
+    if pa_csv is None:
+        print("SKIP: pyarrow is not installed; the arrow engine is never used.")
+        return
+
+    data = args.csv.read_bytes() if args.csv else sample(args.copies)
+    header_csv, rows_csv = read_all(csv_batches, data, args.batch_size)
+    header_arrow, rows_arrow = read_all(arrow_batches, data, args.batch_size)
+    if header_csv != header_arrow:
+        print(f"FAIL: headers differ\n  csv:   {header_csv}\n  arrow: {header_arrow}")
+        sys.exit(1)
+    diff = [i for i, (a, b) in enumerate(zip(rows_csv, rows_arrow)) if a != b]
+    if len(rows_csv) != len(rows_arrow) or diff:
+        print(f"FAIL: csv read {len(rows_csv):,} rows, arrow {len(rows_arrow):,}; {len(diff)} differ")
+        for i in diff[:3]:
+            print(f"  row {i + 1}:\n    csv:   {rows_csv[i]}\n    arrow: {rows_arrow[i]}")
+        sys.exit(1)
+    print(f"Both engines read the same {len(rows_csv):,} rows.")
+
+if __name__ == "__main__":
+    main()
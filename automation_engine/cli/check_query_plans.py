@@ -0,0 +1,121 @@
+﻿# check_query_plans.py
+import argparse, random, shutil, sqlite3, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
+
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(UTILS))
+from db import Database
+from schema import SCHEMA_VERSION, migrate
+
+STATUSES = [None, "pending", "pending", "prepared", "posted", "posted", "posted", "failed", "sold"]
+
+# name -> (sql, params, aliases of listings that must never be scanned)
+# Keep these in step with the queries they mirror.
+HOT_QUERIES = {
+    "dashboard": ("""
+      SELECT
+        c.id, c.campaign_name, c.status, c.created_at, c.next_run_at,
+        SUM(CASE WHEN l.status IS NULL OR l.status='pending' THEN 1 ELSE 0 END) AS pending,
+        SUM(CASE WHEN l.status='prepared' THEN 1 ELSE 0 END) AS prepared,
+        SUM(CASE WHEN l.status='posted' THEN 1 ELSE 0 END) AS posted,
+        COUNT(l.id) as total
+      FROM campaigns c
+      LEFT JOIN listings l ON l.campaign_id=c.id
+      GROUP BY c.id
+      ORDER BY c.id DESC
+    """, (), ("l",)),
+    "campaign_detail": ("SELECT * FROM listings WHERE campaign_id=? ORDER BY id ASC", (7,), ("listings",)),
+    "cache_images_for_campaign": ("SELECT * FROM listings WHERE campaign_id=?", (7,), ("listings",)),
+    "fetch_listings(pending)": ("""
+      SELECT * FROM listings WHERE campaign_id=? AND (status IS NULL OR status='pending') ORDER BY id ASC LIMIT ?
+    """, (7, 50), ("listings",)),
+    "fetch_listings(status)": ("SELECT * FROM listings WHERE campaign_id=? AND status=? ORDER BY id ASC LIMIT ?",
+                               (7, "failed", 50), ("listings",)),
+    "pick_due": ("""
+      SELECT * FROM listings
+      WHERE campaign_id=? AND (status IS NULL OR status='pending')
+        AND scheduled_at IS NOT NULL AND scheduled_at <= ?
+      ORDER BY scheduled_at ASC, id ASC LIMIT ?
+    """, (7, "2030-01-01T00:00:00Z", 5), ("listings",)),
+    "cache_pinned": ("""
+      SELECT images, images_json, images_cached_json FROM listings WHERE status IS NULL OR status='pending'
+    """, (), ("listings",)),
+    "listing_by_id": ("SELECT fb_listing_url FROM listings WHERE id=?", (12345,), ("listings",)),
+}
+
+def generate(path: Path, listings: int, campaigns: int):
+    """A canonical-schema DB with `listings` rows spread over `campaigns` campaigns."""
+    db = Database(path)
+    migrate(db)
+    conn = db.connect()
+    rnd = random.Random(1)
+    conn.executemany("INSERT INTO campaigns (id, campaign_name, status, created_at) VALUES (?,?,?,?)",
+                     [(i, f"Campaign_{i}", "active", "2025-01-01T00:00:00Z") for i in range(1, campaigns + 1)])
+    def rows():
+        for i in range(listings):
+            due = f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T09:00:00Z" if rnd.random() < 0.1 else None
+            yield (rnd.randint(1, campaigns), "facebook", f"Listing {i}", rnd.choice(STATUSES), due,
+                   f'["https://example.com/{i}/1.jpg"]')
+    conn.executemany("""
+      INSERT INTO listings (campaign_id, platform, title, status, scheduled_at, images_json) VALUES (?,?,?,?,?,?)
+    """, rows())
+    conn.execute("ANALYZE")
+    conn.commit(); conn.close()
+    return db
+
+def full_scans(plan, aliases) -> list[str]:
+    """Plan rows that read every row of a listed table (a plain SCAN, with or without an index)."""
+    return [d for d in plan if d.startswith("SCAN ") and d.split()[1] in aliases]
+
+def check(conn) -> list[dict]:
+    results = []
+    for name, (sql, params, aliases) in HOT_QUERIES.items():
+        plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        results.append({"query": name, "plan": plan, "scans": full_scans(plan, aliases),
+                        "ms": (time.perf_counter() - t0) * 1000})
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description="Fail if a hot listings query falls back to a full table scan")
+    ap.add_argument("--listings", type=int, default=1_000_000, help="rows in the generated database")
+    ap.add_argument("--campaigns", type=int, default=50)
+    ap.add_argument("--db", type=Path, help="check an existing database (read-only) instead of generating one")
+    ap.add_argument("--verbose", action="store_true", help="print every query plan")
+    args = ap.parse_args()
+
+    if args.db:
+        tmp = None
+        conn = sqlite3.connect(f"file:{args.db.as_posix()}?mode=ro", uri=True)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            print(f"Warning: {args.db} is at schema version {version} of {SCHEMA_VERSION}; start the app once to migrate it.")
+    else:
+        tmp = Path(tempfile.mkdtemp(prefix="query-plans-"))
+        t0 = time.perf_counter()
+        db = generate(tmp / "plans.db", args.listings, args.campaigns)
+        print(f"Generated {args.listings:,} listings in {args.campaigns} campaigns ({time.perf_counter() - t0:.1f}s)")
+        conn = db.connect()
+
+    results = check(conn)
+    conn.close()
+    if tmp:
+        db.close_all()
+        shutil.rmtree(tmp, ignore_errors=True)
+    width = max(len(r["query"]) for r in results)
+    for r in results:
+        print(f"{r['query']:<{width}}  {'FULL SCAN' if r['scans'] else 'ok':<9}  {r['ms']:8.1f} ms")
+        for d in (r["plan"] if args.verbose else r["scans"]):
+            print(f"{'':<{width}}    {d}")
+    bad = [r["query"] for r in results if r["scans"]]
+    if bad:
+        print(f"FAIL: {len(bad)} hot quer{'y' if len(bad) == 1 else 'ies'} scan listings: {', '.join(bad)}")
+        sys.exit(1)
+    print("All hot queries use an index.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+﻿# import_csv.py
+import argparse, json, sys
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
+
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(UTILS))
+from csv_import import ENGINES, MODES, import_csv
+from db import database
+from schema import migrate
+
+def main():
+    ap = argparse.ArgumentParser(description="Stream a dealer CSV feed into a campaign")
+    ap.add_argument("campaign", help="campaign name (created if it doesn't exist)")
+    ap.add_argument("csv", type=Path)
+    ap.add_argument("--mode", choices=MODES, default="append",
+                    help="upsert = update the campaign's vehicles by id/VIN, write only new or changed rows")
+    ap.add_argument("--engine", choices=ENGINES, default="auto", help="arrow = pyarrow CSV reader (auto: when installed)")
+    ap.add_argument("--batch-size", type=int, default=5000, help="rows per insert transaction")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    db = database(DB_PATH)
+    migrate(db)
+    with open(args.csv, "rb") as f:
+        r = import_csv(db, args.campaign, f, mode=args.mode, engine=args.engine, batch_size=args.batch_size,
+                       log=(lambda *_: None) if args.json else print)
+    if args.json: print(json.dumps(r, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -7,34 +7,58 @@ ROOT = Path(r"C:/Crazy_poster")
 DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
 
 FB_AUTOMATION = ROOT / "automation_engine" / "facebook_automation"
+UTILS = ROOT / "automation_engine" / "utils"
 sys.path.append(str(FB_AUTOMATION))
+sys.path.append(str(UTILS))
+from db import database
+from schema import columns, migrate
 from facebook_poster_simple import SimpleFacebookPoster
+from browser_pool import BrowserContextPool
+from image_prefetch import ImagePrefetcher
+from lean_mode import LeanProfile
+from playwright_runtime import runtime
 
 def now_utc(): return datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
 
-def has_column(conn, table, col):
-    return any(r[1]==col for r in conn.execute(f"PRAGMA table_info({table})").fetchall())
-
-def ensure_columns():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    cols = [r[1] for r in c.execute("PRAGMA table_info(listings)").fetchall()]
-    to_add = []
-    if "status" not in cols:               to_add.append("ALTER TABLE listings ADD COLUMN status TEXT")
-    if "post_attempts" not in cols:        to_add.append("ALTER TABLE listings ADD COLUMN post_attempts INTEGER")
-    if "last_posted_at" not in cols:       to_add.append("ALTER TABLE listings ADD COLUMN last_posted_at TEXT")
-    if "fb_listing_url" not in cols:       to_add.append("ALTER TABLE listings ADD COLUMN fb_listing_url TEXT")
-    if "images_cached_dir" not in cols:    to_add.append("ALTER TABLE listings ADD COLUMN images_cached_dir TEXT")
-    if "images_cached_json" not in cols:   to_add.append("ALTER TABLE listings ADD COLUMN images_cached_json TEXT")
-    if "last_error_screenshot" not in cols:to_add.append("ALTER TABLE listings ADD COLUMN last_error_screenshot TEXT")
-    for sql in to_add: c.execute(sql)
-    conn.commit(); conn.close()
-
-def fetch_listings(campaign_id, limit, only_status="pending"):
-    conn = sqlite3.connect(DB_PATH); conn.row_factory=sqlite3.Row; c=conn.cursor()
-    cols=[r[1] for r in c.execute("PRAGMA table_info(listings)").fetchall()]
+def database_for(root=None):
+    # the DB under `root` (ROOT unless given; the benchmark posts against a throwaway root)
+    return database(DB_PATH if root is None else Path(root) / DB_PATH.relative_to(ROOT))
+
+def connect(row_factory=None, root=None):
+    # pooled WAL connection (utils/db.py); close() returns it to the pool
+    return database_for(root).connect(row_factory)
+
+def ensure_columns(root=None):
+    # canonical schema (utils/schema.py): migrated once per process, column map cached after that
+    return migrate(database_for(root))
+
+def has_column(table, col, root=None):
+    return col in columns(database_for(root), table)
+
+def record_step_timings(account, row, attempt, timer, root=None):
+    """Stores the attempt's spans in posting_steps and appends them to the account's steps.jsonl."""
+    lid = row["id"]; cid = row["campaign_id"] if "campaign_id" in row.keys() else None
+    try:
+        conn = connect(root=root)
+        conn.executemany("""
+          INSERT INTO posting_steps (listing_id, campaign_id, account, attempt, step, started_at,
+                                     duration_ms, candidate, outcome, error)
+          VALUES (?,?,?,?,?,?,?,?,?,?)
+        """, [(lid, cid, account, attempt, s.step, s.started_at, s.duration_ms, s.candidate, s.outcome, s.error)
+              for s in timer.spans])
+        conn.commit(); conn.close()
+    except Exception as e:
+        print(f"Could not store step timings for listing {lid}: {e}")
+    timer.write_jsonl(Path(root or ROOT) / "account-instances" / account / "logs" / "steps.jsonl",
+                      listing_id=lid, campaign_id=cid, account=account, attempt=attempt)
+
+def fetch_listings(campaign_id, limit, only_status="pending", ids=None, root=None):
+    conn = connect(sqlite3.Row, root); c=conn.cursor()
     where = "campaign_id=?"; params=[campaign_id]
-    if "status" in cols:
+    if ids is not None:
+        ids = list(ids) or [None]
+        where += f" AND id IN ({','.join('?' * len(ids))})"; params.extend(ids)
+    if has_column("listings", "status", root):
         if only_status=="pending":
             where += " AND (status IS NULL OR status='pending')"
         else:
@@ -42,13 +66,18 @@ def fetch_listings(campaign_id, limit, only_status="pending"):
     sql=f"SELECT * FROM listings WHERE {where} ORDER BY id ASC LIMIT ?"; params.append(limit)
     rows=c.execute(sql, params).fetchall(); conn.close(); return rows
 
-def update_listing_status(listing_id, *, status=None, attempts_inc=0, fb_url=None, error_screenshot=None):
-    conn = sqlite3.connect(DB_PATH); c=conn.cursor(); sets=[]; vals=[]
+def update_listing_status(listing_id, *, status=None, attempts_inc=0, fb_url=None, error_screenshot=None,
+                          image_rejects=None, account=None, root=None):
+    conn = connect(root=root); c=conn.cursor(); sets=[]; vals=[]
     if attempts_inc: sets.append("post_attempts=COALESCE(post_attempts,0)+?"); vals.append(attempts_inc)
-    if status is not None and has_column(conn,"listings","status"): sets.append("status=?"); vals.append(status)
-    if has_column(conn,"listings","last_posted_at"): sets.append("last_posted_at=?"); vals.append(now_utc())
-    if fb_url and has_column(conn,"listings","fb_listing_url"): sets.append("fb_listing_url=?"); vals.append(fb_url)
-    if error_screenshot and has_column(conn,"listings","last_error_screenshot"): sets.append("last_error_screenshot=?"); vals.append(error_screenshot)
+    cols = ensure_columns(root)["listings"]
+    if status is not None and "status" in cols: sets.append("status=?"); vals.append(status)
+    if "last_posted_at" in cols: sets.append("last_posted_at=?"); vals.append(now_utc())
+    if fb_url and "fb_listing_url" in cols: sets.append("fb_listing_url=?"); vals.append(fb_url)
+    if account and "posted_account" in cols: sets.append("posted_account=?"); vals.append(account)
+    if error_screenshot and "last_error_screenshot" in cols: sets.append("last_error_screenshot=?"); vals.append(error_screenshot)
+    if image_rejects is not None and "image_rejects_json" in cols:
+        sets.append("image_rejects_json=?"); vals.append(json.dumps(image_rejects) if image_rejects else None)
     if sets:
         vals.append(listing_id)
         c.execute(f"UPDATE listings SET {', '.join(sets)} WHERE id=?", vals)
@@ -66,7 +95,8 @@ def parse_images(row):
     if "images_cached_json" in row.keys() and row["images_cached_json"]:
         try:
             arr = json.loads(row["images_cached_json"])
-            if isinstance(arr, list) and arr: return arr[:10]
+            # stale once a cached file is evicted; the source URLs below still hit the image cache
+            if isinstance(arr, list) and arr and all(Path(p).is_file() for p in arr): return arr[:10]
         except: pass
     # JSON column
     if "images_json" in row.keys() and row["images_json"]:
@@ -104,24 +134,35 @@ def row_to_listing_dict(row):
         "hideFromFriends": g("hide_from_friends", g("hideFromFriends","0")),
     }
 
-async def post_single_listing(account, row, *, do_publish: bool, listing_tag: str):
+async def post_single_listing(account, row, *, do_publish: bool, listing_tag: str, pool=None, input_profile="human",
+                              attempt=1, prefetch=None, upload_mode="file", root=None, base_url=None):
     listing = row_to_listing_dict(row)
     images = parse_images(row)
 
-    bot = SimpleFacebookPoster(account)
+    bot = SimpleFacebookPoster(account, pool=pool, input_profile=input_profile, base_path=root, base_url=base_url)
     fb_url = None
+    broken = False
     try:
         if not await bot.start_browser(): return False, None, None
-        if not await bot.goto_facebook(): return False, None, None
+        if not bot.warm and not await bot.goto_facebook(): return False, None, None
 
-        await bot.page.goto("https://www.facebook.com/marketplace/create/vehicle")
-        await asyncio.sleep(1.5)
+        await bot.page.goto(f"{bot.base_url}/marketplace/create/vehicle")
 
         if not await bot.ensure_vehicle_type_first(listing.get("vehicleType","Car/Truck")):
             return False, None, None
 
         if images:
-            files = await bot.download_listing_images(images, listing_id=listing_tag)
+            files = None
+            if prefetch is not None:
+                with bot.timer.span("wait_prefetch"):
+                    files, rejects = await prefetch.take(row["id"], images)
+                if files is not None and attempt == 1:
+                    update_listing_status(row["id"], image_rejects=rejects, root=root)
+            if files is None:
+                files = await bot.download_listing_images(images, listing_id=listing_tag,
+                                                          buffers=(upload_mode == "buffer"))
+                if bot.image_rejects is not None:
+                    update_listing_status(row["id"], image_rejects=bot.image_rejects, root=root)
             if files: await bot.upload_images(files)
 
         if not await bot.fill_vehicle_listing(listing):
@@ -139,50 +180,138 @@ async def post_single_listing(account, row, *, do_publish: bool, listing_tag: st
             shot = await bot.save_screenshot(listing_tag, "exception")
         except:
             shot = None
+        broken = shot is None  # page no longer answers; don't hand it to the next listing
         return False, None, shot
     finally:
-        try: await bot.close_browser()
+        try: await bot.close_browser(broken=broken)
         except: pass
+        record_step_timings(account, row, attempt, bot.timer, root)
+
+async def run(account: str, campaign_id: int, *, limit=1, attempts=2, publish=False, pool=None):
+    await run_concurrent([account], campaign_id, limit=limit, attempts=attempts, publish=publish,
+                         concurrency=1, pool=pool)
+
+UPLOAD_MODES = ("file", "buffer")
 
-async def run(account: str, campaign_id: int, *, limit=1, attempts=2, publish=False):
-    ensure_columns()
-    rows = fetch_listings(campaign_id, limit, only_status="pending")
+async def run_concurrent(accounts, campaign_id: int, *, limit=1, attempts=2, publish=False,
+                         concurrency=2, pool=None, lean=False, input_profile="human", prefetch=3,
+                         upload_mode="file", ids=None, root=None, base_url=None):
+    """
+    Posts pending listings of one campaign across several accounts (only those in
+    `ids`, when given).
+    Each account runs one worker (one active browser session per profile) that pulls
+    the next listing from a shared queue; at most `concurrency` sessions post at once.
+    Images of the next `prefetch` listings are fetched and prepared while the browsers
+    post (0 = download inside each posting attempt). upload_mode "buffer" hands the
+    prepared images to the file input from memory instead of as paths.
+    root (account-instances, image cache, DB) defaults to ROOT and base_url to
+    Facebook; the benchmark passes its own.
+    """
+    accounts = list(dict.fromkeys(accounts))
+    if not accounts:
+        print("No accounts given."); return
+    ensure_columns(root)
+    rows = fetch_listings(campaign_id, limit, only_status="pending", ids=ids, root=root)
     if not rows:
         print("No pending listings found for this campaign.")
         return
 
-    print(f"Queued {len(rows)} listing(s) from campaign {campaign_id} for account '{account}'.")
-    for row in rows:
-        lid = row["id"]; title = row["title"] if "title" in row.keys() else "(no title)"
-        tag = f"c{campaign_id}-l{lid}"
-        print(f"\n--- Listing {lid}: {title} ---")
-
-        success=False; url=None; shot=None
-        for a in range(1, attempts+1):
-            print(f"Attempt {a}/{attempts} â€¦")
-            ok, url, shot = await post_single_listing(account, row, do_publish=publish, listing_tag=tag)
-            update_listing_status(lid, attempts_inc=1)
-            if ok:
-                success=True
-                update_listing_status(lid, status=("posted" if publish else "prepared"), fb_url=url)
-                print(f"âœ“ Success ({'published' if publish else 'prepared only'}){f' â†’ {url}' if url else ''}")
-                break
-            else:
-                print("Ã— Failed this attempt.")
-
-        if not success:
-            update_listing_status(lid, status="failed", error_screenshot=shot)
-            print(f"Ã— Marked as failed. Screenshot: {shot or '(none)'}")
+    print(f"Queued {len(rows)} listing(s) from campaign {campaign_id} across {len(accounts)} account(s) "
+          f"({', '.join(accounts)}), concurrency {concurrency}.")
+    queue = asyncio.Queue()
+    for row in rows: queue.put_nowait(row)
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def worker(account):
+        while True:
+            try: row = queue.get_nowait()
+            except asyncio.QueueEmpty: return
+            async with slots:
+                try:
+                    await post_with_retries(account, campaign_id, row, attempts=attempts, publish=publish, pool=pool,
+                                            input_profile=input_profile, prefetch=prefetcher, upload_mode=upload_mode,
+                                            root=root, base_url=base_url)
+                except Exception as e:  # e.g. a DB error; the other workers keep posting on the shared pool
+                    print(f"[{account}] Listing {row['id']} raised: {e!r}")
+                    try:
+                        if prefetcher: await prefetcher.release(row["id"])
+                        update_listing_status(row["id"], status="failed", root=root)
+                    except Exception as e2:
+                        print(f"[{account}] Could not mark listing {row['id']} failed: {e2!r}")
+
+    prefetcher = None
+    if prefetch:
+        prefetcher = ImagePrefetcher(Path(root or ROOT) / "assets" / "image-cache", depth=prefetch,
+                                     buffers=(upload_mode == "buffer"))
+        prefetcher.start([(r["id"], imgs) for r in rows if (imgs := parse_images(r))])
+    own_pool = pool is None
+    if own_pool: pool = BrowserContextPool(Path(root or ROOT), lean=(LeanProfile() if lean else None))
+    try:
+        await asyncio.gather(*(worker(a) for a in accounts))
+    finally:
+        if prefetcher:
+            await prefetcher.close()
+            print(prefetcher.format_stats())
+        if own_pool: await pool.close()
+
+async def post_with_retries(account, campaign_id, row, *, attempts, publish, pool, input_profile="human",
+                            prefetch=None, upload_mode="file", root=None, base_url=None):
+    lid = row["id"]; title = row["title"] if "title" in row.keys() else "(no title)"
+    tag = f"c{campaign_id}-l{lid}"
+    print(f"\n--- Listing {lid}: {title} [{account}] ---")
+
+    success=False; url=None; shot=None
+    for a in range(1, attempts+1):
+        print(f"[{account}] Listing {lid} attempt {a}/{attempts} â€¦")
+        ok, url, shot = await post_single_listing(account, row, do_publish=publish, listing_tag=tag, pool=pool,
+                                                  input_profile=input_profile, attempt=a, prefetch=prefetch,
+                                                  upload_mode=upload_mode, root=root, base_url=base_url)
+        update_listing_status(lid, attempts_inc=1, root=root)
+        if ok:
+            success=True
+            update_listing_status(lid, status=("posted" if publish else "prepared"), fb_url=url, account=account,
+                                  root=root)
+            print(f"âœ“ Listing {lid} success ({'published' if publish else 'prepared only'}){f' â†’ {url}' if url else ''}")
+            break
+        else:
+            print(f"Ã— Listing {lid} failed this attempt.")
+    if prefetch is not None: await prefetch.release(lid)  # retries are over; free its slot and kept buffers
+
+    if not success:
+        update_listing_status(lid, status="failed", error_screenshot=shot, root=root)
+        print(f"Ã— Listing {lid} marked as failed. Screenshot: {shot or '(none)'}")
+    return success
+
+def list_accounts():
+    acc_root = ROOT / "account-instances"
+    if not acc_root.exists(): return []
+    return sorted(p.name for p in acc_root.iterdir() if p.is_dir())
 
 def main():
     ap = argparse.ArgumentParser(description="Run Crazy_poster campaign")
-    ap.add_argument("account")
+    ap.add_argument("account", help="account name, comma-separated list, or 'all' for every account-instances dir")
     ap.add_argument("campaign_id", type=int)
     ap.add_argument("--limit", type=int, default=1)
     ap.add_argument("--attempts", type=int, default=2)
     ap.add_argument("--publish", action="store_true")
+    ap.add_argument("--concurrency", type=int, default=2, help="max browser sessions posting at once")
+    ap.add_argument("--lean", action="store_true", help="headless, block fonts/media/trackers, no animations")
+    ap.add_argument("--input", choices=SimpleFacebookPoster.INPUT_PROFILES, default="human",
+                    help="human: per-key typing with delays; fast: fill + read-back")
+    ap.add_argument("--prefetch", type=int, default=3, help="listings whose images are fetched ahead (0 = off)")
+    ap.add_argument("--upload", choices=UPLOAD_MODES, default="file",
+                    help="file: upload prepared files by path; buffer: from memory, kept across retries")
     args = ap.parse_args()
-    asyncio.run(run(args.account, args.campaign_id, limit=args.limit, attempts=args.attempts, publish=args.publish))
+    asyncio.run(main_async(args))
+
+async def main_async(args):
+    try:
+        accounts = list_accounts() if args.account=="all" else [a.strip() for a in args.account.split(",") if a.strip()]
+        await run_concurrent(accounts, args.campaign_id, limit=args.limit, attempts=args.attempts,
+                             publish=args.publish, concurrency=args.concurrency, lean=args.lean,
+                             input_profile=args.input, prefetch=args.prefetch, upload_mode=args.upload)
+    finally:
+        await runtime.shutdown()
 
 if __name__ == "__main__":
     main()
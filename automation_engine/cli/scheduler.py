@@ -8,16 +8,11 @@ DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
 
 CLI = ROOT / "automation_engine" / "cli"
 sys.path.append(str(CLI))
-from post_campaign import run as run_campaign
-
-def ensure_schedule_columns():
-    conn=sqlite3.connect(DB_PATH); c=conn.cursor()
-    cols=[r[1] for r in c.execute("PRAGMA table_info(listings)").fetchall()]
-    if "scheduled_at" not in cols: c.execute("ALTER TABLE listings ADD COLUMN scheduled_at TEXT")
-    conn.commit(); conn.close()
+from post_campaign import connect, ensure_columns, run as run_campaign
+from playwright_runtime import runtime
 
 def pick_due(campaign_id, limit):
-    conn=sqlite3.connect(DB_PATH); conn.row_factory=sqlite3.Row; c=conn.cursor()
+    conn=connect(sqlite3.Row); c=conn.cursor()
     now=datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
     rows=c.execute("""
       SELECT * FROM listings
@@ -28,12 +23,15 @@ def pick_due(campaign_id, limit):
     conn.close(); return rows
 
 async def main_async(account, campaign_id, limit, publish):
-    ensure_schedule_columns()
+    ensure_columns()  # scheduled_at is part of the canonical schema
     due = pick_due(campaign_id, limit)
     if not due:
         print("No due listings."); return
     # Reuse post_campaign runner but limit to N
-    await run_campaign(account, campaign_id, limit=len(due), attempts=2, publish=publish)
+    try:
+        await run_campaign(account, campaign_id, limit=len(due), attempts=2, publish=publish)
+    finally:
+        await runtime.shutdown()
 
 def main():
     ap=argparse.ArgumentParser(description="Run scheduled listings")
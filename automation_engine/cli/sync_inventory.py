@@ -0,0 +1,189 @@
+﻿# sync_inventory.py
+import argparse, asyncio, json, sys
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(r"C:/Crazy_poster")
+DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
+
+FB_AUTOMATION = ROOT / "automation_engine" / "facebook_automation"
+CLI = ROOT / "automation_engine" / "cli"
+UTILS = ROOT / "automation_engine" / "utils"
+sys.path.append(str(FB_AUTOMATION))
+sys.path.append(str(CLI))
+sys.path.append(str(UTILS))
+from browser_pool import BrowserContextPool
+from csv_import import format_summary, import_csv
+from db import database
+from manage_listing import delete_listing, mark_sold
+from playwright_runtime import runtime
+from post_campaign import connect, ensure_columns, list_accounts, now_utc, run_concurrent, update_listing_status
+
+REPOST_FIELDS = {"price", "images", "images_json"}  # what buyers see in the feed card; other edits stay offline
+VANISHED_ACTIONS = ("sold", "delete")
+LIVE_STATUSES = ("posted", "outdated")  # outdated: live with old price/photos after a failed repost
+OFFLINE_STATUSES = ("sold", "deleted", "removed")  # posted again if a sync took it down and the vehicle is back
+
+def is_live(status, url) -> bool:
+    return status in LIVE_STATUSES and bool(url)
+
+def build_plan(db, report: dict, *, vanished: str = "sold") -> list[dict]:
+    """
+    Turns an upsert report (csv_import) into the minimal list of actions:
+      post     new vehicle (already queued as pending by the import), or one back in
+               the feed whose listing an earlier sync took down ("returned": queued again);
+               listings marked sold by hand stay down
+      repost   live listing whose price or photos changed: delete it, queue it again
+      sold / delete   live listing that vanished from the feed
+      drop     vanished listing that was never published: taken out of the queue
+    Live actions carry the listing's posted_account ("account", None if unknown).
+    Changed listings that aren't live need nothing: the import already updated them.
+    Listings left outdated by an earlier sync are reposted again.
+    """
+    conn = db.connect()
+    try:
+        def state(lid):
+            return conn.execute("SELECT status, fb_listing_url, posted_account FROM listings WHERE id=?",
+                                (lid,)).fetchone() or (None, None, None)
+        def new_id(key):
+            if report["campaign_id"] is None: return None  # dry run of a campaign that doesn't exist yet
+            row = conn.execute("SELECT id FROM listings WHERE campaign_id=? AND external_id=? ORDER BY id DESC",
+                               (report["campaign_id"], key)).fetchone()
+            return row[0] if row else None
+
+        plan = [{"action": "post", "id": new_id(key), "external_id": key} for key in report["new_listings"]]
+        if report["campaign_id"] is not None:
+            gone = {v["external_id"] for v in report["vanished_listings"]}
+            # the listing the import matched each key to (the oldest one, see csv_import.Upsert)
+            for lid, key in conn.execute(f"""
+              SELECT l.id, l.external_id FROM listings l
+              JOIN (SELECT MIN(id) AS id FROM listings WHERE campaign_id=? AND external_id IS NOT NULL
+                    GROUP BY external_id) m ON m.id = l.id
+              WHERE l.status IN ({','.join('?' * len(OFFLINE_STATUSES))}) AND l.vanished_at IS NOT NULL
+              ORDER BY l.id
+            """, (report["campaign_id"], *OFFLINE_STATUSES)).fetchall():
+                if key not in gone:
+                    plan.append({"action": "post", "id": lid, "external_id": key, "returned": True})
+        for ch in report["changed_listings"]:
+            status, url, owner = state(ch["id"])
+            if is_live(status, url) and REPOST_FIELDS & set(ch["fields"]):
+                plan.append({"action": "repost", "id": ch["id"], "external_id": ch["external_id"], "url": url,
+                             "account": owner, "fields": ch["fields"]})
+        planned = {a["id"] for a in plan} | {v["id"] for v in report["vanished_listings"]}
+        if report["campaign_id"] is not None:
+            for lid, key, url, owner in conn.execute("""
+              SELECT id, external_id, fb_listing_url, posted_account FROM listings WHERE campaign_id=? AND status='outdated'
+            """, (report["campaign_id"],)).fetchall():
+                if lid not in planned and url:
+                    plan.append({"action": "repost", "id": lid, "external_id": key, "url": url, "account": owner,
+                                 "fields": []})
+        for v in report["vanished_listings"]:
+            status, url, owner = state(v["id"])
+            if is_live(status, url):
+                plan.append({"action": vanished, "id": v["id"], "external_id": v["external_id"], "url": url,
+                             "account": owner})
+            elif status in (None, "pending", "prepared", "failed"):
+                plan.append({"action": "drop", "id": v["id"], "external_id": v["external_id"]})
+        return plan
+    finally:
+        conn.close()
+
+def format_plan(plan: list[dict]) -> str:
+    n = Counter(a["action"] for a in plan)
+    return ", ".join(f"{n[k]} {k}" for k in ("post", "repost", "sold", "delete", "drop") if n[k]) or "nothing to do"
+
+def requeue(listing_id: int):
+    conn = connect()
+    conn.execute("UPDATE listings SET status='pending', fb_listing_url=NULL, vanished_at=NULL WHERE id=?",
+                 (listing_id,))
+    conn.commit(); conn.close()
+
+def take_down(listing_id: int, status: str):
+    # a vanished vehicle: remembered, so build_plan posts it again if the feed brings it back
+    conn = connect()
+    conn.execute("UPDATE listings SET status=?, vanished_at=? WHERE id=?", (status, now_utc(), listing_id))
+    conn.commit(); conn.close()
+
+async def execute(plan: list[dict], accounts: list[str], campaign_id: int, *, pool=None, post: bool = False,
+                  publish: bool = False, concurrency: int = 2) -> Counter:
+    """
+    Runs the browser actions of a plan through manage_listing's mark-sold/delete
+    flows, each in the warm session of the account that posted the listing, then
+    (post=True) posts exactly the listings the plan queued across `accounts`.
+    A listing with no recorded owner is only touched when a single account is given.
+    """
+    done = Counter()
+    queued = [a["id"] for a in plan if a["action"] == "post" and a["id"] is not None]
+    for a in plan:
+        lid = a["id"]
+        if a["action"] == "post":
+            if a.get("returned"):
+                requeue(lid); done["returned"] += 1
+        elif a["action"] == "drop":
+            take_down(lid, "removed"); done["drop"] += 1
+        elif a["action"] in ("sold", "delete", "repost"):
+            account = a.get("account") or (accounts[0] if len(accounts) == 1 else None)
+            if account is None:
+                print(f"[sync] {a['action']} skipped for listing {lid}: unknown posting account, give it explicitly")
+                done["owner_unknown"] += 1; continue
+            flow = mark_sold if a["action"] == "sold" else delete_listing
+            print(f"[sync] {a['action']} listing {lid} ({a['external_id']}) as {account}: {a['url']}")
+            try:
+                ok = await flow(account, a["url"], pool=pool)
+            except Exception as e:  # a navigation timeout must not stop the rest of the plan
+                print(f"[sync] {a['action']} raised for listing {lid}: {e}")
+                ok = False
+            if not ok:
+                print(f"[sync] {a['action']} failed for listing {lid}; left as it is")
+                if a["action"] == "repost": update_listing_status(lid, status="outdated")  # retried next sync
+                done[a["action"] + "_failed"] += 1; continue
+            if a["action"] == "repost":
+                requeue(lid); queued.append(lid)
+            else:
+                take_down(lid, "sold" if a["action"] == "sold" else "deleted")
+            done[a["action"]] += 1
+    if post and queued:
+        await run_concurrent(accounts, campaign_id, limit=len(queued), ids=queued, publish=publish,
+                             concurrency=concurrency, pool=pool)
+    return done
+
+def main():
+    ap = argparse.ArgumentParser(description="Sync a campaign with a new dealer feed, touching only what changed")
+    ap.add_argument("account", help="account(s) for --post, comma-separated or 'all'; live listings are managed "
+                                    "in the account that posted them")
+    ap.add_argument("campaign", help="campaign name")
+    ap.add_argument("csv", type=Path)
+    ap.add_argument("--vanished", choices=VANISHED_ACTIONS, default="sold",
+                    help="what to do with live listings that left the feed")
+    ap.add_argument("--dry-run", action="store_true", help="print the plan, change nothing")
+    ap.add_argument("--post", action="store_true", help="post the new and re-queued listings right away")
+    ap.add_argument("--publish", action="store_true")
+    ap.add_argument("--concurrency", type=int, default=2)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    asyncio.run(main_async(args))
+
+async def main_async(args):
+    accounts = list_accounts() if args.account == "all" else [a.strip() for a in args.account.split(",") if a.strip()]
+    if not accounts and not args.dry_run:
+        print("No accounts given."); return
+    db = database(DB_PATH)
+    ensure_columns()
+    with open(args.csv, "rb") as f:
+        report = import_csv(db, args.campaign, f, mode="upsert", dry_run=args.dry_run)
+    plan = build_plan(db, report, vanished=args.vanished)
+    print(f"[sync] {args.campaign}: {format_summary(report)}")
+    print(f"[sync] plan: {format_plan(plan)}")
+    if args.json: print(json.dumps(plan, indent=2))
+    if args.dry_run or not plan: return
+    pool = BrowserContextPool(ROOT)
+    try:
+        done = await execute(plan, accounts, report["campaign_id"], pool=pool, post=args.post,
+                             publish=args.publish, concurrency=args.concurrency)
+        print(f"[sync] done: {', '.join(f'{v} {k}' for k, v in sorted(done.items())) or 'nothing'}")
+    finally:
+        await pool.close()
+        await runtime.shutdown()
+
+if __name__ == "__main__":
+    main()
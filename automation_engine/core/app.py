@@ -1,5 +1,6 @@
 ﻿# app.py
-import csv
+import asyncio
+import atexit
 import io
 import json
 import os
@@ -8,7 +9,7 @@ import sqlite3
 import threading
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, List
+from typing import List
 
 from flask import Flask, request, redirect, url_for, render_template_string, flash
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -35,294 +36,192 @@ def health():
 ROOT = Path(r"C:/Crazy_poster")
 DB_PATH = ROOT / "shared-resources" / "database" / "crazy_poster.db"
 FB_AUTOMATION = ROOT / "automation_engine" / "facebook_automation"
+CLI = ROOT / "automation_engine" / "cli"
+UTILS = ROOT / "automation_engine" / "utils"
 ASSETS = ROOT / "assets"
 IMAGE_CACHE_ROOT = ASSETS / "image-cache"
+IMAGE_CACHE_BUDGET_GB = 10  # LRU eviction above this; images of pending listings are never evicted
+CACHE_SWEEP_MINUTES = 30
+LEAN_BROWSER = False  # True: headless workers that block fonts/media/trackers (see lean_mode.py)
+INPUT_PROFILE = "human"  # "fast": fill + read-back instead of per-character typing
+UPLOAD_MODE = "file"     # "buffer": hand prepared images to the browser from memory
+CSV_ENGINE = "auto"      # "arrow": pyarrow CSV reader (used by "auto" when installed), "csv": csv module
 
 import sys
 sys.path.append(str(FB_AUTOMATION))
+sys.path.append(str(CLI))
+sys.path.append(str(UTILS))
+from csv_import import format_summary, import_csv
+from db import database
+from schema import columns, migrate
 from facebook_poster_simple import SimpleFacebookPoster  # <-- your working class
+from browser_pool import BrowserContextPool
+from image_cache import ImageCache
+from image_downloader import downloader
+from image_prep import preprocessor_for
+from cache_manager import CacheManager, format_report
+from image_dedupe import Placeholders, dedupe_listing, frequent
+from lean_mode import LeanProfile
+from playwright_runtime import runtime
+from post_campaign import run_concurrent
 
 app = Flask(__name__)
 app.secret_key = "crazy_poster_secret"
-scheduler = BackgroundScheduler()
-scheduler.start()
+scheduler = BackgroundScheduler()  # started by start_services()
+
+# ---- Browser pool ------------------------------------------------------------
+# One event loop thread owns the warm browser contexts, so background runs,
+# scheduled jobs and live-listing actions all check sessions out of the same pool.
+browser_loop = asyncio.new_event_loop()  # its thread is started by start_services(), on first use
+browser_pool = BrowserContextPool(ROOT, lean=(LeanProfile() if LEAN_BROWSER else None))
+
+def run_on_browser_loop(coro):
+    start_services()
+    return asyncio.run_coroutine_threadsafe(coro, browser_loop).result()
+
+@atexit.register
+def _shutdown_browser_loop():
+    if not browser_loop.is_running(): return  # never started, e.g. in an image worker process
+    async def _stop():
+        await browser_pool.close()
+        await runtime.shutdown()
+    try: asyncio.run_coroutine_threadsafe(_stop(), browser_loop).result(timeout=15)
+    except: pass
 
 # ---- Helpers -----------------------------------------------------------------
 def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 def connect():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # pooled WAL connection shared with the background runs (utils/db.py); close() returns it
+    return database(DB_PATH).connect(sqlite3.Row)
 
 def ensure_schema():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = connect()
-    c = conn.cursor()
-    # campaigns
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS campaigns (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        campaign_name TEXT UNIQUE,
-        status TEXT,
-        created_at TEXT,
-        next_run_at TEXT,
-        publish_by_default INTEGER DEFAULT 0
-      )
-    """)
-    # listings (base)
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS listings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        campaign_id INTEGER,
-        platform TEXT,
-        title TEXT,
-        vehicle_type TEXT,
-        make TEXT,
-        model TEXT,
-        year TEXT,
-        mileage TEXT,
-        price TEXT,
-        body_style TEXT,
-        color_ext TEXT,
-        color_int TEXT,
-        condition TEXT,
-        fuel TEXT,
-        transmission TEXT,
-        description TEXT,
-        location TEXT,
-        images TEXT,
-        images_json TEXT,
-        status TEXT,
-        post_attempts INTEGER,
-        last_posted_at TEXT,
-        fb_listing_url TEXT,
-        images_cached_dir TEXT,
-        images_cached_json TEXT,
-        last_error_screenshot TEXT
-      )
-    """)
-    conn.commit()
-    conn.close()
+    # canonical schema + user_version migrations (utils/schema.py); runs once per process
+    return migrate(database(DB_PATH))
 
 def has_column(table: str, col: str) -> bool:
-    conn = connect()
-    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
-    conn.close()
-    return col in cols
+    # start_services() migrated the DB; requests only ever see the cached column map
+    return col in columns(database(DB_PATH), table)
 
 def list_accounts() -> List[str]:
     acc_root = ROOT / "account-instances"
     if not acc_root.exists(): return []
     return sorted([p.name for p in acc_root.iterdir() if p.is_dir()])
 
-def parse_images_from_row(row: sqlite3.Row) -> List[str]:
-    # Prefer cached first
-    if row.get("images_cached_json"):
+def parse_images_from_row(row: sqlite3.Row, cached: bool = True) -> List[str]:
+    # Prefer cached first (cached=False: source URLs only, for re-caching)
+    keys = row.keys()
+    if cached and "images_cached_json" in keys and row["images_cached_json"]:
         try:
             j = json.loads(row["images_cached_json"])
-            if isinstance(j, list) and j: return j[:10]
+            if isinstance(j, list) and j and all(Path(p).is_file() for p in j): return j[:10]
         except:
             pass
-    if row.get("images_json"):
+    if "images_json" in keys and row["images_json"]:
         try:
             j = json.loads(row["images_json"])
             if isinstance(j, list) and j: return j[:10]
         except:
             pass
-    if row.get("images"):
+    if "images" in keys and row["images"]:
         parts = re.split(r"[;\s,]+", row["images"].strip())
         parts = [p for p in parts if p]
         return parts[:10]
     return []
 
-def row_to_listing_dict(row: sqlite3.Row) -> dict:
-    def g(col, default=""):
-        return row[col] if col in row.keys() and row[col] is not None else default
-    clean_int = lambda v: int(re.sub(r"[^\d]", "", str(v))) if str(v).strip() else ""
-    return {
-        "vehicleType": g("vehicle_type", g("vehicleType", "Car/Truck")),
-        "year": int(g("year", 0)) if str(g("year", "")).isdigit() else g("year", ""),
-        "make": g("make", ""),
-        "model": g("model", ""),
-        "mileage": clean_int(g("mileage", "")),
-        "price": clean_int(g("price", "")),
-        "bodyStyle": g("body_style", g("bodystyle", "")),
-        "colorExt": g("color_ext", ""),
-        "colorInt": g("color_int", ""),
-        "condition": g("condition", ""),
-        "fuel": g("fuel", ""),
-        "transmission": g("transmission", ""),
-        "description": g("description", ""),
-        "location": g("location", ""),
-        "title": g("title", ""),
-        "hideFromFriends": g("hide_from_friends", g("hideFromFriends", "0")),
-    }
-
 # ---- CSV import & image caching ---------------------------------------------
 def import_csv_bytes(campaign_name: str, data: bytes) -> int:
     """
     Imports a CSV (bytes) into the DB under campaign_name.
     Returns campaign_id.
     """
-    ensure_schema()
-    conn = connect()
-    c = conn.cursor()
-
-    # create or get campaign
-    row = c.execute("SELECT id FROM campaigns WHERE campaign_name=?", (campaign_name,)).fetchone()
-    if row:
-        campaign_id = row["id"]
-    else:
-        c.execute("INSERT INTO campaigns (campaign_name, status, created_at) VALUES (?, ?, ?)",
-                  (campaign_name, "active", now_utc()))
-        campaign_id = c.lastrowid
-
-    # parse CSV
-    f = io.StringIO(data.decode("utf-8-sig"))
-    rdr = csv.DictReader(f)
-    required = ["platform","title","vehicleType","make","model","year","mileage","price","description","location"]
-    missing = [h for h in required if h not in rdr.fieldnames]
-    if missing:
-        conn.close()
-        raise ValueError(f"Missing columns: {', '.join(missing)}")
-
-    count = 0
-    for row in rdr:
-        # images: prefer images_json; else images
-        images_json = None
-        if row.get("images_json"):
-            try:
-                images_json = json.dumps(json.loads(row["images_json"]))
-            except:
-                images_json = None
-        images = row.get("images", "")
-
-        c.execute("""
-          INSERT INTO listings (
-            campaign_id, platform, title, vehicle_type, make, model, year, mileage, price,
-            body_style, color_ext, color_int, condition, fuel, transmission, description,
-            location, images, images_json, status
-          ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """, (
-            campaign_id, row.get("platform","facebook"), row.get("title",""),
-            row.get("vehicleType","Car/Truck"), row.get("make",""), row.get("model",""),
-            row.get("year",""), row.get("mileage",""), row.get("price",""),
-            row.get("bodyStyle",""), row.get("colorExt",""), row.get("colorInt",""),
-            row.get("condition",""), row.get("fuel",""), row.get("transmission",""),
-            row.get("description",""), row.get("location",""),
-            images, images_json, "pending"
-        ))
-        count += 1
+    return import_csv_file(campaign_name, io.BytesIO(data))["campaign_id"]
 
-    conn.commit()
-    conn.close()
-    return campaign_id
+def import_csv_file(campaign_name: str, stream, mode: str = "append") -> dict:
+    """
+    Streams a CSV file object into the DB under campaign_name in batched
+    transactions (utils/csv_import.py). mode "upsert" updates the campaign's
+    vehicles in place by feed id/VIN instead of adding them again.
+    Returns the import report.
+    """
+    return import_csv(database(DB_PATH), campaign_name, stream, mode=mode, engine=CSV_ENGINE)
 
 def cache_images_for_campaign(campaign_id: int) -> int:
     """
     Downloads and caches images for all listings in campaign.
-    Saves local paths in images_cached_* columns.
+    Files live once per content hash in IMAGE_CACHE_ROOT (shared across listings
+    and campaigns); images_cached_json gets the resized upload copies.
+    Already-cached URLs are revalidated with conditional requests, so a refresh
+    only re-downloads photos the dealer actually replaced.
+    Near-duplicate photos within a listing and placeholder images (known ones, or
+    a picture on a good share of the feed's listings, learned per campaign) are left out and recorded
+    in image_rejects_json.
     """
-    ensure_schema()
-    IMAGE_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+    cache = ImageCache(IMAGE_CACHE_ROOT)
+    prep = preprocessor_for(cache)
+    conn = connect()
+    rows = conn.execute("SELECT * FROM listings WHERE campaign_id=?", (campaign_id,)).fetchall()
+    conn.close()
+    todo = [(row["id"], parse_images_from_row(row, cached=False)[:10]) for row in rows]
+    todo = [(lid, urls) for lid, urls in todo if urls]
+
+    # Runs on the browser loop so the downloader's per-host limit also covers live posting;
+    # a few listings at a time, each with its own deadline once it starts.
+    async def fetch_all():
+        slots = asyncio.Semaphore(4)
+        async def one(urls):
+            async with slots:
+                rejects = []
+                files = await downloader.fetch_listing(urls, cache, revalidate=True, rejects=rejects)
+                files = await prep.prepare_many(files)
+                return files, await prep.phashes(files), rejects
+        return await asyncio.gather(*(one(urls) for _, urls in todo))
+
+    results = run_on_browser_loop(fetch_all())
+    placeholders = Placeholders(IMAGE_CACHE_ROOT / "placeholders.json")
+    learned = placeholders.learn(frequent([hashes for _, hashes, _ in results]), source=campaign_id)
+    if learned: print(f"Campaign {campaign_id}: learned {len(learned)} placeholder image(s) from its feed")
     conn = connect()
-    c = conn.cursor()
-    rows = c.execute("SELECT * FROM listings WHERE campaign_id=?", (campaign_id,)).fetchall()
-    cached = 0
-    for row in rows:
-        lid = row["id"]
-        urls = parse_images_from_row(row)
-        if not urls: continue
-        out_dir = IMAGE_CACHE_ROOT / f"c{campaign_id}" / f"l{lid}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        local_files = []
-
-        # If url starts with http, let facebook_poster_simple download/verify later.
-        # Here we only keep a pass-through cache: if it's a local path, copy; if http, store the URL list.
-        # To keep it simple, we just store whatever we have as images_cached_json.
-        for u in urls[:10]:
-            local_files.append(u)
-
-        c.execute("UPDATE listings SET images_cached_dir=?, images_cached_json=? WHERE id=?",
-                  (str(out_dir), json.dumps(local_files), lid))
+    cached = dropped = 0
+    for (lid, _), (files, hashes, rejects) in zip(todo, results):
+        local_files, removed = dedupe_listing(files, hashes, placeholders)
+        rejects += [{"url": cache.url_of(files[r["index"]]) or files[r["index"]], "reason": r["reason"]} for r in removed]
+        dropped += len(removed)
+        # reason codes: http_<status>, not_image, bad_magic, too_large, corrupt, empty, timeout, network, deadline,
+        # duplicate, placeholder
+        conn.execute("UPDATE listings SET image_rejects_json=? WHERE id=?",
+                     (json.dumps(rejects) if rejects else None, lid))
+        if not local_files: continue
+        conn.execute("UPDATE listings SET images_cached_dir=NULL, images_cached_json=? WHERE id=?",
+                     (json.dumps(local_files), lid))
         cached += 1
-
     conn.commit()
     conn.close()
+    if dropped: print(f"Campaign {campaign_id}: left out {dropped} duplicate/placeholder image(s)")
     return cached
 
-# ---- Posting engine (uses your SimpleFacebookPoster) -------------------------
-def update_listing_status(listing_id: int, *, status: Optional[str] = None,
-                          fb_url: Optional[str] = None, error_screenshot: Optional[str] = None):
-    conn = connect(); c = conn.cursor()
-    sets, vals = [], []
-    sets.append("post_attempts = COALESCE(post_attempts,0) + 1")
-    if status is not None: sets.append("status=?"); vals.append(status)
-    sets.append("last_posted_at=?"); vals.append(now_utc())
-    if fb_url: sets.append("fb_listing_url=?"); vals.append(fb_url)
-    if error_screenshot: sets.append("last_error_screenshot=?"); vals.append(error_screenshot)
-    vals.append(listing_id)
-    c.execute(f"UPDATE listings SET {', '.join(sets)} WHERE id=?", vals)
-    conn.commit(); conn.close()
+def cache_manager() -> CacheManager:
+    return CacheManager(ImageCache(IMAGE_CACHE_ROOT), database(DB_PATH), ROOT / "account-instances",
+                        budget_bytes=int(IMAGE_CACHE_BUDGET_GB * 2**30))
 
-async def post_single_listing(account: str, row: sqlite3.Row, do_publish: bool):
-    listing = row_to_listing_dict(row)
-    images = parse_images_from_row(row)
-    tag = f"c{row['campaign_id']}-l{row['id']}"
-    bot = SimpleFacebookPoster(account)
-    fb_url = None
-    try:
-        if not await bot.start_browser(): return False, None, None
-        if not await bot.goto_facebook(): return False, None, None
-        await bot.page.goto("https://www.facebook.com/marketplace/create/vehicle")
-        await bot.ensure_vehicle_type_first(listing.get("vehicleType","Car/Truck"))
-
-        if images:
-            files = await bot.download_listing_images(images, listing_id=tag)
-            if files: await bot.upload_images(files)
-
-        filled = await bot.fill_vehicle_listing(listing)
-        if not filled: return False, None, None
-
-        if do_publish:
-            ok_pub, fb_url = await bot.finalize_and_publish(listing, prefer_no_groups=True)
-            if not ok_pub:
-                shot = await bot.save_screenshot(tag, "publish-not-confirmed")
-                return False, fb_url, shot
-        return True, fb_url, None
-    except Exception:
-        try:
-            shot = await bot.save_screenshot(tag, "exception")
-        except:
-            shot = None
-        return False, None, shot
-    finally:
-        try: await bot.close_browser()
-        except: pass
+def sweep_image_cache() -> dict:
+    """Scheduled: drop old temp-images dirs, then evict LRU images over budget."""
+    report = cache_manager().run()
+    print(format_report(report))
+    return report
 
-def run_campaign_background(account: str, campaign_id: int, limit: int, publish: bool):
+# ---- Posting engine (shared with cli/post_campaign.py) ----------------------
+def run_campaign_background(account, campaign_id: int, limit: int, publish: bool, concurrency: int = 2):
     """
-    Runs in a thread; uses asyncio per listing.
+    Runs in a thread; the listings themselves run on the shared browser loop.
+    `account` may be one account name or a list of them; listings are spread
+    across the accounts with at most `concurrency` browsers posting at once.
     """
-    import asyncio
-    conn = connect()
-    rows = conn.execute("""
-        SELECT * FROM listings
-        WHERE campaign_id=? AND (status IS NULL OR status='pending')
-        ORDER BY id ASC LIMIT ?
-    """, (campaign_id, limit)).fetchall()
-    conn.close()
-
-    async def _run():
-        for row in rows:
-            ok, url, shot = await post_single_listing(account, row, publish)
-            update_listing_status(row["id"],
-                                  status=("posted" if publish and ok else "prepared" if ok else "failed"),
-                                  fb_url=url,
-                                  error_screenshot=(None if ok else shot))
-    asyncio.run(_run())
+    accounts = [account] if isinstance(account, str) else list(account)
+    run_on_browser_loop(run_concurrent(accounts, campaign_id, limit=limit, attempts=1,
+                                       publish=publish, concurrency=concurrency, pool=browser_pool,
+                                       input_profile=INPUT_PROFILE, upload_mode=UPLOAD_MODE))
 
 # ---- APScheduler job helpers -------------------------------------------------
 def schedule_campaign_once(campaign_id: int, dt_iso: str, account: str, publish: bool, limit: int):
@@ -376,7 +275,6 @@ BASE_HTML = """
 
 @app.route("/")
 def dashboard():
-    ensure_schema()
     conn = connect()
     camps = conn.execute("""
       SELECT
@@ -417,12 +315,13 @@ def dashboard():
             <summary>Run now</summary>
             <form method="post" action="{{ url_for('run_now') }}">
               <input type="hidden" name="campaign_id" value="{{ c['id'] }}">
-              <label>Account
-                <select name="account" required>
+              <label>Accounts
+                <select name="account" multiple required>
                   {% for a in accounts %}<option value="{{ a }}">{{ a }}</option>{% endfor %}
                 </select>
               </label>
               <label>Limit <input type="number" name="limit" value="1" min="1"></label>
+              <label>Parallel browsers <input type="number" name="concurrency" value="2" min="1"></label>
               <label><input type="checkbox" name="publish"> Publish</label>
               <button type="submit">Run</button>
             </form>
@@ -455,7 +354,6 @@ def dashboard():
 
 @app.route("/upload", methods=["GET", "POST"])
 def upload_csv():
-    ensure_schema()
     if request.method == "POST":
         campaign = request.form.get("campaign") or "Campaign_" + datetime.now().strftime("%Y%m%d_%H%M%S")
         file = request.files.get("csvfile")
@@ -463,8 +361,11 @@ def upload_csv():
             flash("Please choose a CSV file")
             return redirect(request.url)
         try:
-            cid = import_csv_bytes(campaign, file.read())
-            flash(f"âœ“ Imported CSV into campaign '{campaign}' (ID {cid})")
+            mode = "upsert" if request.form.get("update_existing") else "append"
+            r = import_csv_file(campaign, file.stream, mode)
+            cid = r["campaign_id"]
+            flash(f"âœ“ Imported {r['rows']} listing(s) into campaign '{campaign}' (ID {cid}) "
+                  f"at {r['rows_per_sec']:,} rows/s" + (f": {format_summary(r)}" if mode == "upsert" else ""))
             return redirect(url_for("campaign_detail", campaign_id=cid))
         except Exception as e:
             flash(f"Error importing CSV: {e}")
@@ -476,6 +377,7 @@ def upload_csv():
   <form method="post" enctype="multipart/form-data">
     <label>Campaign name <input name="campaign" placeholder="MyCampaign"></label>
     <label>CSV file <input type="file" name="csvfile" accept=".csv" required></label>
+    <label><input type="checkbox" name="update_existing"> Update existing vehicles (match on id / VIN column)</label>
     <p>Required headers: platform,title,vehicleType,make,model,year,mileage,price,description,location
        (images or images_json optional)</p>
     <button type="submit">Import</button>
@@ -486,7 +388,6 @@ def upload_csv():
 
 @app.route("/campaign/<int:campaign_id>")
 def campaign_detail(campaign_id: int):
-    ensure_schema()
     conn = connect()
     camp = conn.execute("SELECT * FROM campaigns WHERE id=?", (campaign_id,)).fetchone()
     listings = conn.execute("SELECT * FROM listings WHERE campaign_id=? ORDER BY id ASC", (campaign_id,)).fetchall()
@@ -502,12 +403,13 @@ def campaign_detail(campaign_id: int):
     <summary>Run Campaign</summary>
     <form method="post" action="{{ url_for('run_now') }}">
       <input type="hidden" name="campaign_id" value="{{ camp['id'] }}">
-      <label>Account
-        <select name="account" required>
+      <label>Accounts
+        <select name="account" multiple required>
           {% for a in accounts %}<option value="{{ a }}">{{ a }}</option>{% endfor %}
         </select>
       </label>
       <label>Limit <input type="number" name="limit" value="1" min="1"></label>
+      <label>Parallel browsers <input type="number" name="concurrency" value="2" min="1"></label>
       <label><input type="checkbox" name="publish"> Publish</label>
       <button type="submit">Run</button>
     </form>
@@ -515,6 +417,10 @@ def campaign_detail(campaign_id: int):
       <input type="hidden" name="campaign_id" value="{{ camp['id'] }}">
       <button>Pre-cache images</button>
     </form>
+    <form method="post" action="{{ url_for('forget_placeholders') }}" style="margin-top: .5rem">
+      <input type="hidden" name="campaign_id" value="{{ camp['id'] }}">
+      <button>Forget placeholders learned from this feed</button>
+    </form>
   </details>
 
   <details>
@@ -577,19 +483,29 @@ def campaign_detail(campaign_id: int):
 {% endblock %}
 """, camp=camp, listings=listings, accounts=accounts)
 
+@app.get("/metrics/runtime")
+def runtime_metrics():
+    # live Playwright drivers/contexts/pages; these should stay flat across campaigns
+    return {**runtime.stats(), "pool": browser_pool.stats(), "db": database(DB_PATH).stats()}
+
+@app.get("/metrics/image-cache")
+def image_cache_metrics():
+    return {**ImageCache(IMAGE_CACHE_ROOT).stats(), "budget": int(IMAGE_CACHE_BUDGET_GB * 2**30)}
+
 @app.post("/run-now")
 def run_now():
     campaign_id = int(request.form["campaign_id"])
-    account = request.form["account"]
+    accounts = request.form.getlist("account")
     limit = int(request.form.get("limit", 1))
     publish = bool(request.form.get("publish"))
+    concurrency = int(request.form.get("concurrency", 2))
 
     threading.Thread(
         target=run_campaign_background,
-        args=(account, campaign_id, limit, publish),
+        args=(accounts, campaign_id, limit, publish, concurrency),
         daemon=True,
     ).start()
-    flash(f"Started background run for campaign {campaign_id} (account {account}, limit {limit}, {'publish' if publish else 'dry-run'})")
+    flash(f"Started background run for campaign {campaign_id} (accounts {', '.join(accounts)}, limit {limit}, {'publish' if publish else 'dry-run'})")
     return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
 @app.post("/schedule-once")
@@ -616,6 +532,13 @@ def cache_images():
     flash(f"Cached image references for {n} listing(s).")
     return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
+@app.post("/forget-placeholders")
+def forget_placeholders():
+    campaign_id = int(request.form["campaign_id"])
+    n = Placeholders(IMAGE_CACHE_ROOT / "placeholders.json").forget(campaign_id)
+    flash(f"Forgot {n} placeholder image(s) learned from campaign {campaign_id}; pre-cache again to restore its photos.")
+    return redirect(url_for("campaign_detail", campaign_id=campaign_id))
+
 @app.post("/delete-from-campaign")
 def delete_from_campaign():
     campaign_id = int(request.form["campaign_id"])
@@ -631,43 +554,31 @@ def mark_sold():
 
     # get url
     conn = connect()
-    row = conn.execute("SELECT fb_listing_url FROM listings WHERE id=?", (listing_id,)).fetchone()
+    row = conn.execute("SELECT fb_listing_url, posted_account FROM listings WHERE id=?", (listing_id,)).fetchone()
     conn.close()
     if not row or not row["fb_listing_url"]:
         flash("No fb_listing_url on this listing.")
         return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
-    # choose first account for sold action (or make a select in UI if you want)
-    accounts = list_accounts()
-    if not accounts:
+    # the session that posted the listing; first account for listings posted before that was recorded
+    account = row["posted_account"] or (list_accounts() or [None])[0]
+    if not account:
         flash("No accounts found.")
         return redirect(url_for("campaign_detail", campaign_id=campaign_id))
-    account = accounts[0]
 
     # run in background
     def _bg():
-        import asyncio
         async def _go():
-            bot = SimpleFacebookPoster(account)
+            bot = SimpleFacebookPoster(account, pool=browser_pool)
             try:
                 if not await bot.start_browser(): return
-                if not await bot.goto_facebook(): return
+                if not bot.warm and not await bot.goto_facebook(): return
                 await bot.page.goto(row["fb_listing_url"])
-                for sel in [
-                    bot.page.get_by_role("button", name="Mark as sold"),
-                    bot.page.get_by_text("Mark as sold", exact=False).first,
-                    "button:has-text('Mark as sold')",
-                ]:
-                    try:
-                        loc = sel if isinstance(sel, str) else sel
-                        await (bot.page.locator(loc) if isinstance(loc,str) else loc).click(timeout=3000)
-                        await asyncio.sleep(1.0)
-                        return
-                    except: pass
+                await bot.mark_listing_sold()
             finally:
                 try: await bot.close_browser()
                 except: pass
-        asyncio.run(_go())
+        run_on_browser_loop(_go())
     threading.Thread(target=_bg, daemon=True).start()
     flash(f"Mark-sold triggered for listing {listing_id}.")
     return redirect(url_for("campaign_detail", campaign_id=campaign_id))
@@ -678,52 +589,62 @@ def delete_live():
     listing_id = int(request.form["listing_id"])
 
     conn = connect()
-    row = conn.execute("SELECT fb_listing_url FROM listings WHERE id=?", (listing_id,)).fetchone()
+    row = conn.execute("SELECT fb_listing_url, posted_account FROM listings WHERE id=?", (listing_id,)).fetchone()
     conn.close()
     if not row or not row["fb_listing_url"]:
         flash("No fb_listing_url on this listing.")
         return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
-    account = (list_accounts() or [None])[0]
+    account = row["posted_account"] or (list_accounts() or [None])[0]
     if not account:
         flash("No accounts found.")
         return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
     def _bg():
-        import asyncio
         async def _go():
-            bot = SimpleFacebookPoster(account)
+            bot = SimpleFacebookPoster(account, pool=browser_pool)
             try:
                 if not await bot.start_browser(): return
-                if not await bot.goto_facebook(): return
+                if not bot.warm and not await bot.goto_facebook(): return
                 await bot.page.goto(row["fb_listing_url"])
-                for sel in [
-                    bot.page.get_by_role("button", name="Delete listing"),
-                    bot.page.get_by_text("Delete listing", exact=False).first,
-                    "button:has-text('Delete listing')",
-                ]:
-                    try:
-                        loc = sel if isinstance(sel, str) else sel
-                        await (bot.page.locator(loc) if isinstance(loc,str) else loc).click(timeout=3000)
-                        await asyncio.sleep(0.8)
-                        try:
-                            await bot.page.get_by_role("button", name="Delete").click(timeout=3000)
-                        except:
-                            await bot.page.get_by_text("Delete", exact=False).first.click(timeout=3000)
-                        await asyncio.sleep(1.0)
-                        return
-                    except: pass
+                await bot.delete_current_listing()
             finally:
                 try: await bot.close_browser()
                 except: pass
-        asyncio.run(_go())
+        run_on_browser_loop(_go())
     threading.Thread(target=_bg, daemon=True).start()
     flash(f"Delete-live triggered for listing {listing_id}.")
     return redirect(url_for("campaign_detail", campaign_id=campaign_id))
 
 
+# ---- Startup -----------------------------------------------------------------
+# Importing this module has no side effects: on Windows the image workers (a spawn
+# process pool) import it again as __mp_main__, and must not migrate the DB, start
+# the scheduler or open a browser loop of their own. The services start on first
+# use instead (first request or first browser-loop call), also under `flask run`
+# and WSGI servers that never run __main__.
+_services_lock = threading.Lock()
+_services_started = False
+
+def start_services():
+    """Migrates the DB, starts the browser loop and the scheduler (with the cache sweep); once per process."""
+    global _services_started
+    if _services_started: return
+    with _services_lock:
+        if _services_started: return
+        ensure_schema()
+        threading.Thread(target=browser_loop.run_forever, daemon=True, name="browser-loop").start()
+        scheduler.add_job(sweep_image_cache, trigger="interval", minutes=CACHE_SWEEP_MINUTES, id="image-cache-sweep",
+                          replace_existing=True)
+        scheduler.start()
+        _services_started = True
+
+@app.before_request
+def _start_services_on_first_request():
+    start_services()
+
 if __name__ == "__main__":
-    ensure_schema()
     # Suggest running with:  python app.py
     # then open http://127.0.0.1:5000
+    start_services()
     app.run(host="127.0.0.1", port=5000, debug=True)
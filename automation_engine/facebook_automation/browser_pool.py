@@ -0,0 +1,146 @@
+﻿# browser_pool.py
+import asyncio, time
+from pathlib import Path
+
+from lean_mode import LeanMode, LeanProfile
+from playwright_runtime import runtime
+
+def _accept_beforeunload(dialog):
+    # A half-filled composer asks "Leave page?" - the next listing must be able to navigate away.
+    if dialog.type == "beforeunload":
+        asyncio.ensure_future(dialog.accept())
+    else:
+        asyncio.ensure_future(dialog.dismiss())
+
+class PooledSession:
+    def __init__(self, account_name: str, context, page, lean: LeanMode | None = None):
+        self.account_name = account_name
+        self.context = context
+        self.page = page
+        self.lean = lean
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.listings = 0
+
+    @property
+    def warm(self) -> bool:
+        return self.listings > 0
+
+class BrowserContextPool:
+    """
+    Long-lived pool of persistent Chromium contexts, one per account directory.
+    Runs check a session out with acquire() and hand it back with release().
+    Sessions are health-checked on checkout, evicted after idle_ttl seconds
+    without use and recycled after max_listings checkouts. With a LeanProfile
+    every context is launched headless with request blocking installed.
+    """
+    def __init__(self, base_path=Path("C:/Crazy_poster"), *, idle_ttl: float = 900,
+                 max_listings: int = 20, headless: bool = False, viewport: dict | None = None,
+                 lean: LeanProfile | None = None):
+        self.base_path = Path(base_path)
+        self.idle_ttl = idle_ttl
+        self.max_listings = max_listings
+        self.headless = headless
+        self.lean = lean
+        self.viewport = viewport or {"width": 1366, "height": 768}
+        self.launches = 0
+        self._sessions: dict[str, PooledSession] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._reaper = None
+
+    def log(self, msg: str): print(f"[pool] {msg}")
+
+    def _lock(self, account: str) -> asyncio.Lock:
+        # A persistent profile can only be opened once, so one checkout per account at a time.
+        return self._locks.setdefault(account, asyncio.Lock())
+
+    # ---------- checkout ----------
+    async def acquire(self, account: str) -> PooledSession:
+        lock = self._lock(account)
+        await lock.acquire()
+        try:
+            self._ensure_reaper()
+            s = self._sessions.get(account)
+            if s and not await self._healthy(s):
+                self.log(f"Session for {account} failed health check; relaunching")
+                await self._discard(account)
+                s = None
+            if s is None:
+                s = await self._launch(account)
+                self._sessions[account] = s
+            return s
+        except Exception:
+            lock.release()
+            raise
+
+    async def release(self, session: PooledSession, *, broken: bool = False):
+        account = session.account_name
+        try:
+            session.listings += 1
+            session.last_used = time.monotonic()
+            if self._sessions.get(account) is session and (broken or session.listings >= self.max_listings):
+                self.log(f"Recycling session for {account} after {session.listings} listing(s)"
+                         + (" (broken)" if broken else ""))
+                await self._discard(account)
+        finally:
+            self._lock(account).release()
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "launches": self.launches,
+                "in_use": sum(1 for l in self._locks.values() if l.locked())}
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for account in list(self._sessions):
+            await self._discard(account)
+        self.log(f"Pool closed after {self.launches} launch(es); {runtime.format_stats()}")
+
+    # ---------- internals ----------
+    async def _launch(self, account: str) -> PooledSession:
+        profile = self.base_path / "account-instances" / account / "browser-profile"
+        opts = {"headless": self.headless, "viewport": self.viewport}
+        if self.lean: opts.update(self.lean.launch_options())
+        context = await runtime.launch_persistent_context(str(profile), **opts)
+        lean = None
+        if self.lean:
+            lean = LeanMode(self.lean)
+            await lean.apply(context)
+        page = context.pages[0] if context.pages else await context.new_page()
+        page.on("dialog", _accept_beforeunload)
+        self.launches += 1
+        self.log(f"Launched context for {account} (launch #{self.launches}{', lean' if lean else ''})")
+        return PooledSession(account, context, page, lean)
+
+    async def _healthy(self, s: PooledSession) -> bool:
+        try:
+            if s.page.is_closed():
+                return False
+            await asyncio.wait_for(s.page.evaluate("1"), timeout=5)
+            return True
+        except:
+            return False
+
+    async def _discard(self, account: str):
+        s = self._sessions.pop(account, None)
+        if s:
+            try: await s.context.close()
+            except: pass
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap_idle())
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(60, self.idle_ttl))
+            now = time.monotonic()
+            for account, s in list(self._sessions.items()):
+                lock = self._lock(account)
+                if lock.locked() or now - s.last_used < self.idle_ttl:
+                    continue
+                async with lock:
+                    if self._sessions.get(account) is s:
+                        self.log(f"Evicting idle session for {account}")
+                        await self._discard(account)
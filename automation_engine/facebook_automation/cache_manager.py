@@ -0,0 +1,96 @@
+﻿# cache_manager.py
+import json, re, shutil, sqlite3, time
+from pathlib import Path
+
+class CacheManager:
+    """
+    Keeps the image cache and the per-account temp-images folders off the disk budget.
+
+      evict()        LRU eviction (by blob last_used) until the cache fits `budget_bytes`;
+                     images of listings still pending in the main DB are pinned
+      sweep()        removes account-instances/*/temp-images/* older than `temp_max_age`
+                     and stray *.tmp files left in the cache by interrupted writes
+      run()          both, returning a report (also used by the scheduled job)
+    """
+    def __init__(self, cache, db, accounts_root: Path, *, budget_bytes: int,
+                 temp_max_age: int = 6 * 3600):
+        self.cache = cache
+        self.db = db  # main DB (utils/db.py Database); pinned() borrows a pooled connection
+        self.accounts_root = Path(accounts_root)
+        self.budget_bytes = budget_bytes
+        self.temp_max_age = temp_max_age
+
+    def pinned(self) -> set[str]:
+        """Blob hashes used by pending listings (source URLs and cached paths)."""
+        try:
+            conn = self.db.connect()
+            try:
+                rows = conn.execute("""
+                  SELECT images, images_json, images_cached_json FROM listings WHERE status IS NULL OR status='pending'
+                """).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[cache] could not read pending listings, pinning nothing: {e}")
+            return set()
+        urls, paths = set(), set()
+        for images, images_json, cached_json in rows:
+            for raw in (images_json, cached_json):
+                try:
+                    for it in json.loads(raw or "[]"):
+                        (urls if str(it).lower().startswith("http") else paths).add(str(it))
+                except:
+                    pass
+            if images:
+                urls.update(p for p in re.split(r"[;\s,]+", images.strip()) if p.lower().startswith("http"))
+        return self.cache.shas_for_urls(urls) | ({self.cache.sha_of(p) for p in paths} - {None})
+
+    def evict(self) -> dict:
+        used = self.cache.total_bytes()
+        freed = evicted = 0
+        if used > self.budget_bytes:
+            pinned = self.pinned()
+            for sha, size in self.cache.lru():
+                if used - freed <= self.budget_bytes: break
+                if sha in pinned: continue
+                freed += self.cache.evict(sha)
+                evicted += 1
+        return {"evicted": evicted, "evicted_bytes": freed, "over_budget": used - freed > self.budget_bytes}
+
+    def sweep(self) -> dict:
+        cutoff = time.time() - self.temp_max_age
+        dirs = freed = 0
+        for tmp_root in self.accounts_root.glob("*/temp-images"):
+            for d in tmp_root.iterdir():
+                try:
+                    if d.stat().st_mtime > cutoff: continue
+                    size = sum(f.stat().st_size for f in d.rglob("*") if f.is_file()) if d.is_dir() else d.stat().st_size
+                    shutil.rmtree(d) if d.is_dir() else d.unlink()
+                    dirs += 1; freed += size
+                except OSError:
+                    pass
+        stale = time.time() - 3600
+        for f in [f for root in (self.cache.blob_root, self.cache.prepared_root, self.cache.incoming_root)
+                  for f in root.rglob("*.tmp")]:
+            try:
+                if f.stat().st_mtime < stale:
+                    freed += f.stat().st_size
+                    f.unlink()
+            except OSError:
+                pass
+        if freed: self.cache.add_reclaimed(freed)
+        return {"temp_dirs_removed": dirs, "swept_bytes": freed}
+
+    def run(self) -> dict:
+        report = {**self.sweep(), **self.evict()}
+        report.update(self.cache.stats(), budget=self.budget_bytes)
+        return report
+
+def format_report(r: dict) -> str:
+    rate = f"{r['hit_rate'] * 100:.1f}%" if r.get("hit_rate") is not None else "n/a"
+    return (f"Image cache: {r['bytes'] / 2**20:.1f} MB of {r['budget'] / 2**20:.0f} MB in {r['blobs']} image(s), "
+            f"hit rate {rate} ({r['hits']} hits / {r['misses']} misses); "
+            f"this run evicted {r['evicted']} ({r['evicted_bytes'] // 1024} KB), "
+            f"swept {r['temp_dirs_removed']} temp dir(s) ({r['swept_bytes'] // 1024} KB); "
+            f"reclaimed {r['bytes_reclaimed'] / 2**20:.1f} MB in total"
+            + (" - still over budget (pinned images)" if r.get("over_budget") else ""))
@@ -1,19 +1,40 @@
 ﻿# facebook_poster_simple.py
-import asyncio, json, os, random, time
-from io import BytesIO
+import asyncio, random, re, time
 from pathlib import Path
-from urllib.parse import urlparse
 
-import requests
-from PIL import Image
-from playwright.async_api import async_playwright
+from image_cache import ImageCache
+from image_downloader import downloader
+from image_prep import preprocessor_for
+from lean_mode import LeanMode, LeanProfile
+from playwright_runtime import runtime
+from selector_cache import SelectorCache
+from step_timer import StepTimer, timed
 
 class SimpleFacebookPoster:
-    def __init__(self, account_name: str):
+    # "human": per-character typing with random delays; "fast": fill/insert_text,
+    # verified by reading the value back, keystrokes only when the read-back differs.
+    INPUT_PROFILES = ("human", "fast")
+    BASE_PATH = Path("C:/Crazy_poster")
+    BASE_URL = "https://www.facebook.com"  # the offline benchmark passes marketplace_standin's instead
+    CLICK_FLOOR_MS = 250  # least time a raced winner gets to take its click once the race deadline is spent
+
+    def __init__(self, account_name: str, pool=None, lean: LeanProfile | None = None,
+                 input_profile: str = "human", base_path=None, base_url: str | None = None):
         self.account_name = account_name
-        self.base_path = Path("C:/Crazy_poster")
+        self.base_path = Path(base_path) if base_path else self.BASE_PATH
+        self.base_url = base_url or self.BASE_URL
         self.account_path = self.base_path / "account-instances" / account_name
         self.browser_profile_path = self.account_path / "browser-profile"
+        self.image_cache_root = self.base_path / "assets" / "image-cache"
+        self.selectors = SelectorCache(self.account_path / "selector-cache.json")
+        self.timer = StepTimer()  # spans for this posting attempt
+        self.image_rejects = None  # [{"url", "reason"}] from the last download_listing_images
+        self.pool = pool        # optional BrowserContextPool shared across listings
+        self.session = None
+        self.lean_profile = lean  # only used when launching without a pool
+        self.lean = None          # LeanMode of the current context, if any
+        self.input_profile = input_profile if input_profile in self.INPUT_PROFILES else "human"
+        self.race_deadline = 0.0  # time.monotonic() deadline of the last _race_visible
         self.context = None
         self.page = None
 
@@ -21,15 +42,33 @@ class SimpleFacebookPoster:
     def log(self, msg: str): print(f"[{self.account_name}] {msg}")
 
     # ---------- browser ----------
+    @property
+    def warm(self) -> bool:
+        """True when a pooled session already served a listing (facebook.com is loaded)."""
+        return bool(self.session and self.session.warm)
+
+    @timed("start_browser")
     async def start_browser(self):
+        if self.pool is not None:
+            try:
+                self.session = await self.pool.acquire(self.account_name)
+                self.context, self.page = self.session.context, self.session.page
+                self.lean = self.session.lean
+                if self.lean: self.lean.reset()
+                if self.warm: await self._detect_locale()  # goto_facebook() is skipped on a warm page
+                self.log("Browser session checked out" + (" (warm)" if self.warm else ""))
+                return True
+            except Exception as e:
+                self.log(f"Browser checkout failed: {e}")
+                return False
         try:
             self.log("Starting browser...")
-            pw = await async_playwright().start()
-            self.context = await pw.chromium.launch_persistent_context(
-                user_data_dir=str(self.browser_profile_path),
-                headless=False,
-                viewport={"width": 1366, "height": 768},
-            )
+            opts = {"headless": False, "viewport": {"width": 1366, "height": 768}}
+            if self.lean_profile: opts.update(self.lean_profile.launch_options())
+            self.context = await runtime.launch_persistent_context(str(self.browser_profile_path), **opts)
+            if self.lean_profile:
+                self.lean = LeanMode(self.lean_profile)
+                await self.lean.apply(self.context)
             self.page = await self.context.new_page()
             self.log("Browser started successfully")
             return True
@@ -37,16 +76,26 @@ class SimpleFacebookPoster:
             self.log(f"Browser start failed: {e}")
             return False
 
+    @timed("goto_facebook")
     async def goto_facebook(self):
         try:
-            await self.page.goto("https://www.facebook.com", wait_until="domcontentloaded")
+            await self.page.goto(self.base_url, wait_until="domcontentloaded")
+            await self._detect_locale()  # before any learned selector is read or written
             self.log("Navigated to Facebook")
             return True
         except Exception as e:
             self.log(f"Navigation failed: {e}")
             return False
 
-    async def close_browser(self):
+    async def close_browser(self, broken: bool = False):
+        self.selectors.save()
+        if self.lean:
+            self.log(self.lean.format_report())
+        if self.session is not None:
+            session, self.session = self.session, None
+            await self.pool.release(session, broken=broken)
+            self.log("Browser session returned to pool")
+            return
         try:
             if self.context:
                 await self.context.close()
@@ -55,27 +104,86 @@ class SimpleFacebookPoster:
             self.log(f"Error closing browser: {e}")
 
     # ---------- generic helpers ----------
-    async def _first_visible(self, locators, timeout_each=1500):
-        for loc in locators:
+    def _record(self, field, index: int, count: int):
+        # a different winner replaces the remembered one (the DOM changed under it)
+        if field: self.selectors.hit(field, index, count)
+
+    def _as_locator(self, sel, scope=None):
+        if isinstance(sel, str):
+            return (scope or self.page).locator(sel)
+        if callable(sel):  # e.g. lambda s: s.get_by_role(...), built on the scope
+            return sel(scope or self.page)
+        return sel if scope is None else None  # page-bound locators can't be re-scoped
+
+    async def _race_visible(self, candidates: list, timeout=3000, field: str | None = None, scope=None, grace=0.05):
+        """
+        Waits for all candidates at once under one overall deadline and returns
+        (index, locator) of the first that becomes visible, or (None, None).
+        Candidates that turn up within `grace` seconds of each other are ranked by
+        the learned winner for `field` first, then by list order.
+        """
+        self.race_deadline = time.monotonic() + timeout / 1000
+        locs = [self._as_locator(c, scope) for c in candidates]
+        count = len(locs)
+        w = self.selectors.winner(field, count) if field else None
+        if w is not None and locs[w] is not None:
             try:
-                await loc.wait_for(timeout=timeout_each)
-                return loc
+                if await locs[w].is_visible():  # fast path: no waiting at all
+                    self._record(field, w, count)
+                    self.timer.note_candidate(w)
+                    return w, locs[w]
             except:
-                continue
-        return None
+                pass
+        rank = {i: r for r, i in enumerate(self.selectors.order(field, count) if field else range(count))}
+        tasks = {asyncio.ensure_future(loc.wait_for(state="visible", timeout=timeout)): i
+                 for i, loc in enumerate(locs) if loc is not None}
+        won = []
+        try:
+            pending = set(tasks)
+            while pending and not won:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                won = [tasks[t] for t in done if not t.cancelled() and t.exception() is None]
+                if won and pending and grace:
+                    late, pending = await asyncio.wait(pending, timeout=grace)
+                    won += [tasks[t] for t in late if not t.cancelled() and t.exception() is None]
+        finally:
+            for t in tasks:
+                if not t.done(): t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if not won:
+            if field: self.selectors.forget(field)
+            return None, None
+        i = min(won, key=rank.get)
+        self._record(field, i, count)
+        self.timer.note_candidate(i)
+        return i, locs[i]
+
+    def _click_timeout(self) -> float:
+        """ms left on the last race's deadline (at least CLICK_FLOOR_MS), for clicking its winner."""
+        return max(self.CLICK_FLOOR_MS, (self.race_deadline - time.monotonic()) * 1000)
+
+    async def _first_visible(self, locators, timeout=2000, field: str | None = None):
+        _, loc = await self._race_visible(locators, timeout, field)
+        return loc
+
+    async def _try_click_any(self, selectors: list, scope=None, timeout=1500, field: str | None = None,
+                             settle: float = 0.4) -> bool:
+        _, loc = await self._race_visible(selectors, timeout, field, scope=scope)
+        if loc is None:
+            return False
+        try:
+            await loc.click(timeout=self._click_timeout())
+            if settle: await asyncio.sleep(settle)
+            return True
+        except:
+            return False
 
-    async def _try_click_any(self, selectors: list, scope=None, timeout_each=1500) -> bool:
-        page = scope or self.page
-        for sel in selectors:
-            try:
-                loc = page.locator(sel) if isinstance(sel, str) else (sel if scope is None else scope.locator(sel.selector))
-                await loc.wait_for(timeout=timeout_each)
-                await loc.click()
-                await asyncio.sleep(0.4)
-                return True
-            except:
-                continue
-        return False
+    async def _detect_locale(self):
+        try:
+            lang = await self.page.evaluate("document.documentElement.lang || navigator.language")
+        except:
+            lang = None
+        self.selectors.set_locale(lang)
 
     async def save_screenshot(self, listing_id: str, tag: str = "error") -> str | None:
         try:
@@ -92,7 +200,7 @@ class SimpleFacebookPoster:
     # ---------- vehicle type first ----------
     VEHICLE_TYPE_SYNONYMS = ["Vehicle type", "Type", "Vehicle category", "Category"]
 
-    async def _open_dropdown_by_label(self, names: list[str]):
+    async def _open_dropdown_by_label(self, names: list[str], field: str | None = None):
         locs = []
         for n in names:
             locs += [
@@ -104,15 +212,15 @@ class SimpleFacebookPoster:
                 self.page.locator(f"[aria-label*='{n}' i]"),
             ]
         locs.append(self.page.get_by_role("combobox").first)
-        for loc in locs:
-            try:
-                await loc.wait_for(timeout=1500)
-                await loc.click()
-                await asyncio.sleep(0.25)
-                return loc
-            except:
-                continue
-        return None
+        loc = await self._first_visible(locs, timeout=3000, field=field)
+        if loc is None:
+            return None
+        try:
+            await loc.click(timeout=self._click_timeout())
+            await asyncio.sleep(0.25)
+            return loc
+        except:
+            return None
 
     async def _pick_option(self, value: str):
         try:
@@ -120,16 +228,20 @@ class SimpleFacebookPoster:
             return True
         except:
             try:
-                await self.page.keyboard.type(value, delay=int(random.uniform(35, 90)))
+                if self.input_profile == "fast":
+                    await self.page.keyboard.insert_text(value)
+                else:
+                    await self.page.keyboard.type(value, delay=int(random.uniform(35, 90)))
                 await asyncio.sleep(0.25)
                 await self.page.keyboard.press("Enter")
                 return True
             except:
                 return False
 
+    @timed("ensure_vehicle_type_first")
     async def ensure_vehicle_type_first(self, target="Car/Truck"):
         self.log("Setting Vehicle type first...")
-        dd = await self._open_dropdown_by_label(self.VEHICLE_TYPE_SYNONYMS)
+        dd = await self._open_dropdown_by_label(self.VEHICLE_TYPE_SYNONYMS, field="Vehicle type")
         if not dd:
             try:
                 await self.page.get_by_role("button", name=target).click(timeout=1500)
@@ -147,16 +259,12 @@ class SimpleFacebookPoster:
             await asyncio.wait_for(asyncio.shield(self.page.wait_for_load_state("networkidle")), timeout=5)
         except:
             pass
-        for loc in [
+        if await self._first_visible([
             self.page.get_by_label("Year"),
             self.page.get_by_placeholder("Year"),
             self.page.get_by_role("combobox", name="Year"),
-        ]:
-            try:
-                await loc.wait_for(timeout=2000)
-                return True
-            except:
-                continue
+        ], timeout=4000, field="Year (form ready)"):
+            return True
         self.log("Vehicle type set, but Year/Make not visible yet.")
         return False
 
@@ -192,18 +300,52 @@ class SimpleFacebookPoster:
         return locs
 
     async def _smart_field(self, name: str):
-        return await self._first_visible(self._candidates_for(name), timeout_each=2000)
+        return await self._first_visible(self._candidates_for(name), timeout=3000, field=name)
+
+    @staticmethod
+    def _same_value(actual, expected) -> bool:
+        if actual is None:
+            return False
+        want = " ".join(str(expected).split())
+        got = " ".join(str(actual).split())
+        if want.isdigit():  # the composer formats numbers ("$18,500", "35,000 km")
+            return "".join(ch for ch in got if ch.isdigit()) == want
+        return got == want
+
+    async def _read_back(self, locator, contenteditable: bool):
+        try:
+            return await (locator.inner_text() if contenteditable else locator.input_value())
+        except:
+            return None
+
+    async def _fast_fill(self, locator, text, contenteditable: bool) -> bool:
+        """fill()/insert_text() in one step; True when the field reads back the value."""
+        try:
+            if contenteditable:
+                await self.page.keyboard.press("Ctrl+A")
+                await self.page.keyboard.press("Backspace")
+                await self.page.keyboard.insert_text(str(text))
+            else:
+                await locator.fill(str(text))
+        except:
+            return False
+        return self._same_value(await self._read_back(locator, contenteditable), text)
 
     async def _type_smart(self, locator, text, label=""):
         try:
             if locator is None:
                 raise RuntimeError("locator is None")
-            await locator.click()
+            await locator.click(timeout=self._click_timeout())
             await asyncio.sleep(0.15)
             try:
                 ce = await locator.get_attribute("contenteditable")
             except:
                 ce = None
+            if self.input_profile == "fast":
+                if await self._fast_fill(locator, text, ce == "true"):
+                    self.log(f"Filled {label or 'field'}: {text}")
+                    return True
+                self.log(f"{label or 'field'}: fast fill did not read back; typing instead")
             if ce == "true":
                 await self.page.keyboard.press("Ctrl+A")
                 await asyncio.sleep(0.05)
@@ -229,8 +371,18 @@ class SimpleFacebookPoster:
             if not cb:
                 self.log(f"{name}: combobox not found")
                 return False
-            await cb.click()
+            await cb.click(timeout=self._click_timeout())
             await asyncio.sleep(0.15)
+            if self.input_profile == "fast":
+                await self.page.keyboard.insert_text(str(value))
+                try:
+                    await self.page.get_by_role("option", name=value, exact=False).click(timeout=1000)
+                    self.log(f"Selected {name}: {value}")
+                    return True
+                except:
+                    # typeahead ignored the inserted text; clear it and type it out
+                    await self.page.keyboard.press("Ctrl+A")
+                    await self.page.keyboard.press("Backspace")
             for ch in str(value):
                 await self.page.keyboard.type(ch, delay=int(random.uniform(25, 60)))
             await asyncio.sleep(0.2)
@@ -253,13 +405,14 @@ class SimpleFacebookPoster:
             if not loc:
                 self.log("Location field not found; continuing without it.")
                 return False
-            await loc.click()
+            await loc.click(timeout=self._click_timeout())
             await asyncio.sleep(0.15)
-            try:
-                await loc.fill("")
-            except:
-                pass
-            await loc.type(location_text, delay=30)
+            if not (self.input_profile == "fast" and await self._fast_fill(loc, location_text, False)):
+                try:
+                    await loc.fill("")
+                except:
+                    pass
+                await loc.type(location_text, delay=30)
             await asyncio.sleep(0.6)
             # pick first suggestion if present
             try:
@@ -273,29 +426,15 @@ class SimpleFacebookPoster:
             return False
 
     # ---------- images ----------
-    def _ext_from_url(self, url: str, default=".jpg"):
-        try:
-            path = urlparse(url).path
-            ext = os.path.splitext(path)[1].lower()
-            if ext in [".jpg", ".jpeg", ".png", ".webp"]:
-                return ext
-        except:
-            pass
-        return default
-
-    def _sanitize_ext(self, ext: str):
-        return ".jpg" if ext.lower() in [".jpeg", ".jpg"] else (ext if ext.lower() in [".png", ".webp"] else ".jpg")
-
-    def _save_verified(self, content: bytes, dest_path: Path):
-        with Image.open(BytesIO(content)) as im:
-            im.verify()
-        dest_path.write_bytes(content)
-
-    async def download_listing_images(self, items: list[str], listing_id: str = "listing"):
+    @timed("download_listing_images")
+    async def download_listing_images(self, items: list[str], listing_id: str = "listing", buffers: bool = False):
         """
         Accepts URLs or local file paths. Local paths pass-through.
-        URLs are downloaded under: account/temp-images/<listing_id>-<ts>/img_X.ext
-        Returns list of local file paths.
+        URLs resolve through the shared image cache (assets/image-cache) and are
+        only downloaded on a miss; verified copies are stored once by content hash.
+        Returns list of local file paths, resized for upload (image_prep.py), or with
+        buffers=True in-memory set_input_files() payloads of them.
+        URLs that were rejected end up in self.image_rejects with a reason code.
         """
         if not items:
             return []
@@ -305,76 +444,128 @@ class SimpleFacebookPoster:
             p = Path(it)
             if p.exists() and p.is_file():
                 all_local.append(str(p))
+        cache = await asyncio.to_thread(ImageCache, self.image_cache_root)  # opens the index (sqlite)
         if len(all_local) == len(items):
             self.log(f"Using cached local images: {len(all_local)}")
-            return all_local
+            await asyncio.to_thread(cache.touch_paths, all_local)
+            if not buffers: return all_local
 
-        out_dir = self.account_path / "temp-images" / f"{listing_id}-{int(time.time())}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        saved = []
-        for idx, url in enumerate(items, 1):
-            if str(url).lower().startswith("http"):
-                try:
-                    self.log(f"Downloading image {idx}: {url}")
-                    r = requests.get(url, timeout=20)
-                    if r.status_code != 200 or not r.content:
-                        self.log(f"Skip (HTTP {r.status_code})")
-                        continue
-                    ext = self._sanitize_ext(self._ext_from_url(url))
-                    dest = out_dir / f"img_{idx}{ext}"
-                    self._save_verified(r.content, dest)
-                    saved.append(str(dest))
-                except Exception as e:
-                    self.log(f"Skip image {idx}: {e}")
-        self.log(f"Images downloaded: {len(saved)} â†’ {out_dir}")
+        self.image_rejects = []
+        saved = await downloader.fetch_listing(items, cache, rejects=self.image_rejects, log=self.log)
+        saved = await preprocessor_for(cache).prepare_many(saved, log=self.log, buffers=buffers)
+        self.log(f"Images ready: {len(saved)}/{len(items)} ({listing_id}) â†’ {self.image_cache_root}")
         return saved
 
-    async def upload_images(self, file_paths: list[str]):
+    # Resolves once `n` new thumbnails were added under the composer, or with the
+    # count seen so far when the deadline passes.
+    # Installed (and awaited) before the files are handed over, so no thumbnail is missed;
+    # THUMBNAIL_WAIT_JS then waits for the count it stored on window.
+    THUMBNAIL_OBSERVER_JS = """
+    ({n, timeoutMs}) => { window.__cpThumbnails = new Promise(resolve => {
+      const root = document.querySelector('[role="main"]') || document.body;
+      const isThumb = el => el.tagName === 'IMG' && /^(blob:|data:image|https?:)/.test(el.currentSrc || el.src || '');
+      const count = node => node.nodeType !== 1 ? 0
+        : (isThumb(node) ? 1 : 0) + [...node.querySelectorAll('img')].filter(isThumb).length;
+      let seen = 0;
+      const finish = () => { obs.disconnect(); clearTimeout(timer); resolve(seen); };
+      const obs = new MutationObserver(records => {
+        for (const r of records) {
+          if (r.type === 'childList') r.addedNodes.forEach(nd => seen += count(nd));
+          else if (isThumb(r.target) && !r.oldValue) seen += 1;
+        }
+        if (seen >= n) finish();
+      });
+      obs.observe(root, {childList: true, subtree: true, attributes: true, attributeFilter: ['src'], attributeOldValue: true});
+      const timer = setTimeout(finish, timeoutMs);
+    }); }
+    """
+    THUMBNAIL_WAIT_JS = "() => window.__cpThumbnails"
+    UPLOAD_URL_RE = re.compile(r"upload|/photos?[/?]|attachments", re.I)
+
+    @timed("upload_images")
+    async def upload_images(self, file_paths: list):
+        # paths, or {name, mimeType, buffer} payloads (upload mode "buffer")
         if not file_paths:
             self.log("No image files provided")
             return False
-        try:
-            before = await self.page.locator("img").count()
-        except:
-            before = 0
+        n = len(file_paths)
+        deadline = 15 + 3 * n
+        uploaded = 0
+        all_uploaded = asyncio.Event()
 
-        # Strategy 1
-        try:
-            await self.page.set_input_files("input[type='file']", file_paths)
-            self.log("Images queued via input[type=file]")
-        except Exception as e1:
-            self.log(f"Direct input upload not available: {e1}")
-            # Strategy 2
+        def on_response(resp):
+            nonlocal uploaded
             try:
-                btns = [
-                    self.page.get_by_role("button", name="Add photos"),
-                    self.page.get_by_role("button", name="Add Photos"),
-                    self.page.get_by_text("Add photos").first,
-                    self.page.get_by_text("Add Photos").first,
-                ]
-                trigger = await self._first_visible(btns, 1200) or self.page.locator("input[type='file']").nth(0)
-                async with self.page.expect_file_chooser(timeout=5000) as fc:
-                    await trigger.click()
-                chooser = await fc.value
-                await chooser.set_files(file_paths)
-                self.log("Images queued via file chooser")
-            except Exception as e2:
-                self.log(f"Fallback chooser failed: {e2}")
-                return False
+                if resp.request.method == "POST" and resp.ok and self.UPLOAD_URL_RE.search(resp.url):
+                    uploaded += 1
+                    if uploaded >= n: all_uploaded.set()
+            except:
+                pass
 
+        self.page.on("response", on_response)
+        observer = None
+        responses = asyncio.ensure_future(all_uploaded.wait())
+        t0 = time.monotonic()
         try:
-            for _ in range(50):
-                await asyncio.sleep(0.4)
-                after = await self.page.locator("img").count()
-                if after > before:
-                    self.log(f"Thumbnails detected: {after - before} new")
+            try:
+                await self.page.evaluate(self.THUMBNAIL_OBSERVER_JS, {"n": n, "timeoutMs": deadline * 1000})
+                observing = True
+            except Exception as e:
+                self.log(f"Thumbnail observer not installed, waiting for upload responses only: {e}")
+                observing = False
+            # Strategy 1
+            try:
+                await self.page.set_input_files("input[type='file']", file_paths)
+                self.log("Images queued via input[type=file]")
+            except Exception as e1:
+                self.log(f"Direct input upload not available: {e1}")
+                # Strategy 2
+                try:
+                    btns = [
+                        self.page.get_by_role("button", name="Add photos"),
+                        self.page.get_by_role("button", name="Add Photos"),
+                        self.page.get_by_text("Add photos").first,
+                        self.page.get_by_text("Add Photos").first,
+                    ]
+                    trigger = await self._first_visible(btns, 1200, field="Add photos") or self.page.locator("input[type='file']").nth(0)
+                    async with self.page.expect_file_chooser(timeout=5000) as fc:
+                        await trigger.click()
+                    chooser = await fc.value
+                    await chooser.set_files(file_paths)
+                    self.log("Images queued via file chooser")
+                except Exception as e2:
+                    self.log(f"Fallback chooser failed: {e2}")
+                    return False
+
+            waiting = {responses}
+            if observing:
+                observer = asyncio.ensure_future(self.page.evaluate(self.THUMBNAIL_WAIT_JS))
+                waiting.add(observer)
+            # Either signal confirms; an observer that settles short of n (its own timeout,
+            # thumbnails it couldn't see) leaves the upload responses to wait for.
+            while waiting:
+                left = deadline - (time.monotonic() - t0)
+                if left <= 0: break
+                done, waiting = await asyncio.wait(waiting, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+                elapsed = time.monotonic() - t0
+                if responses in done:
+                    self.log(f"Uploads completed: {uploaded}/{n} responses in {elapsed:.1f}s")
                     return True
-        except:
-            pass
-        self.log("Could not confirm thumbnails; verify visually.")
-        return True
+                if observer in done and not observer.exception() and (observer.result() or 0) >= n:
+                    self.log(f"Thumbnails detected: {observer.result()} new in {elapsed:.1f}s")
+                    return True
+            elapsed = time.monotonic() - t0
+            self.log(f"Could not confirm thumbnails within {elapsed:.1f}s ({uploaded}/{n} upload responses); verify visually.")
+            return True
+        finally:
+            self.page.remove_listener("response", on_response)
+            tasks = [t for t in (observer, responses) if t is not None]
+            for t in tasks:
+                if not t.done(): t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     # ---------- form fill ----------
+    @timed("fill_vehicle_listing")
     async def fill_vehicle_listing(self, d: dict):
         try:
             await asyncio.sleep(1.0)
@@ -386,23 +577,34 @@ class SimpleFacebookPoster:
                 pass
 
             # Location first (exact match requested)
-            await self.set_location(d.get("location", ""))
-
-            year_ok  = await self._select_combo("Year",  str(d.get("year", "")))  or await self._type_smart(await self._smart_field("Year"),  d.get("year", ""),  "Year")
-            make_ok  = await self._select_combo("Make",  d.get("make", ""))       or await self._type_smart(await self._smart_field("Make"),  d.get("make", ""),  "Make")
-            model_ok = await self._select_combo("Model", d.get("model", ""))      or await self._type_smart(await self._smart_field("Model"), d.get("model", ""), "Model")
-
-            mileage_ok = await self._type_smart(await self._smart_field("Mileage"), str(d.get("mileage", "")).replace(",", ""), "Mileage/Kilometers")
-            price_ok   = await self._type_smart(await self._smart_field("Price"),   str(d.get("price", "")).replace(",", ""),   "Price")
-
-            await self._select_combo("Body style",          d.get("bodyStyle", "Sedan"))
-            await self._select_combo("Exterior color",      d.get("colorExt", "Silver"))
-            await self._select_combo("Interior color",      d.get("colorInt", "Black"))
-            await self._select_combo("Vehicle condition",   d.get("condition", "Excellent"))
-            await self._select_combo("Fuel type",           d.get("fuel", "Gasoline"))
-            await self._select_combo("Transmission",        d.get("transmission", "Automatic"))
-
-            desc_ok = await self._type_smart(await self._smart_field("Description"), d.get("description", ""), "Description")
+            with self.timer.span("field:Location") as sp:
+                sp.result(await self.set_location(d.get("location", "")))
+
+            with self.timer.span("field:Year") as sp:
+                year_ok  = sp.result(await self._select_combo("Year",  str(d.get("year", "")))  or await self._type_smart(await self._smart_field("Year"),  d.get("year", ""),  "Year"))
+            with self.timer.span("field:Make") as sp:
+                make_ok  = sp.result(await self._select_combo("Make",  d.get("make", ""))       or await self._type_smart(await self._smart_field("Make"),  d.get("make", ""),  "Make"))
+            with self.timer.span("field:Model") as sp:
+                model_ok = sp.result(await self._select_combo("Model", d.get("model", ""))      or await self._type_smart(await self._smart_field("Model"), d.get("model", ""), "Model"))
+
+            with self.timer.span("field:Mileage") as sp:
+                mileage_ok = sp.result(await self._type_smart(await self._smart_field("Mileage"), str(d.get("mileage", "")).replace(",", ""), "Mileage/Kilometers"))
+            with self.timer.span("field:Price") as sp:
+                price_ok   = sp.result(await self._type_smart(await self._smart_field("Price"),   str(d.get("price", "")).replace(",", ""),   "Price"))
+
+            for name, value in [
+                ("Body style",        d.get("bodyStyle", "Sedan")),
+                ("Exterior color",    d.get("colorExt", "Silver")),
+                ("Interior color",    d.get("colorInt", "Black")),
+                ("Vehicle condition", d.get("condition", "Excellent")),
+                ("Fuel type",         d.get("fuel", "Gasoline")),
+                ("Transmission",      d.get("transmission", "Automatic")),
+            ]:
+                with self.timer.span(f"field:{name}") as sp:
+                    sp.result(await self._select_combo(name, value))
+
+            with self.timer.span("field:Description") as sp:
+                desc_ok = sp.result(await self._type_smart(await self._smart_field("Description"), d.get("description", ""), "Description"))
 
             core_ok = all([year_ok, make_ok, model_ok, mileage_ok, price_ok, desc_ok])
             self.log("Core fields populated successfully." if core_ok else "Core fields missingâ€”verify visually.")
@@ -414,11 +616,11 @@ class SimpleFacebookPoster:
     # ---------- publish flow ----------
     async def _clear_groups_if_any(self):
         try:
-            checked = self.page.get_by_role("checkbox", checked=True)
-            n = await checked.count()
-            for i in range(n):
-                await checked.nth(0).click()
-                await asyncio.sleep(0.15)
+            # element handles stay bound to each box, so no settle time is needed between clicks
+            boxes = await self.page.get_by_role("checkbox", checked=True).element_handles()
+            for box in boxes:
+                await box.click()
+            n = len(boxes)
             if n:
                 self.log(f"Cleared {n} preselected group(s)")
         except Exception as e:
@@ -445,18 +647,32 @@ class SimpleFacebookPoster:
             pass
 
     async def _wait_publish_success(self, timeout_ms=12000) -> tuple[bool, str | None]:
+        """Waits for the item URL or the "listing is live" notice, whichever comes first."""
+        t0 = time.monotonic()
+        signals = {
+            asyncio.ensure_future(self.page.wait_for_url("**/marketplace/item/**", timeout=timeout_ms)): "navigation",
+            asyncio.ensure_future(self.page.get_by_text("Your listing is live", exact=False).first.wait_for(timeout=timeout_ms)): "notice",
+        }
+        signal = None
         try:
-            await self.page.wait_for_url("**/marketplace/item/**", timeout=timeout_ms)
-            return True, self.page.url
-        except:
-            pass
-        try:
-            await self.page.get_by_text("Your listing is live", exact=False).wait_for(timeout=4000)
+            pending = set(signals)
+            while pending and signal is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if not t.cancelled() and t.exception() is None:
+                        signal = signals[t]
+        finally:
+            for t in signals:
+                if not t.done(): t.cancel()
+            await asyncio.gather(*signals, return_exceptions=True)
+        elapsed = time.monotonic() - t0
+        if signal:
+            self.log(f"Publish confirmed by {signal} in {elapsed:.1f}s")
             return True, self.page.url
-        except:
-            pass
+        self.log(f"No publish confirmation within {elapsed:.1f}s")
         return False, None
 
+    @timed("finalize_and_publish")
     async def finalize_and_publish(self, listing: dict, prefer_no_groups: bool = True) -> tuple[bool, str | None]:
         self.log("Finalizing listing (Publish flow)â€¦")
 
@@ -481,18 +697,23 @@ class SimpleFacebookPoster:
         hide_flag = str(listing.get("hideFromFriends", "0")).strip().lower() in ("1", "true", "yes", "y")
         await self._apply_hide_from_friends(hide_flag)
 
+        # clicks are followed by explicit waits for the next step, so no settle sleeps here
         async def click_any(scope=None):
-            if await self._try_click_any(publish_buttons, scope=scope): return "publish"
-            if await self._try_click_any(next_buttons,    scope=scope): return "next"
+            if await self._try_click_any(publish_buttons, scope=scope, field="Publish button", settle=0): return "publish"
+            if await self._try_click_any(next_buttons,    scope=scope, field="Next button", settle=0): return "next"
             try:
                 dialog = self.page.locator('[role="dialog"]').first
                 await dialog.wait_for(timeout=600)
-                if await self._try_click_any(publish_buttons, scope=dialog): return "publish"
-                if await self._try_click_any(next_buttons,    scope=dialog): return "next"
+                if await self._try_click_any(publish_buttons, scope=dialog, field="Publish button (dialog)", settle=0): return "publish"
+                if await self._try_click_any(next_buttons,    scope=dialog, field="Next button (dialog)", settle=0): return "next"
             except:
                 pass
             return None
 
+        async def next_step_rendered():
+            # the step after "Next" is either a dialog (groups) or a page with the publish button
+            await self._race_visible([self.page.locator('[role="dialog"]').first] + publish_buttons, timeout=3000)
+
         # Attempt chain: publish immediately, else 3 rounds of next->publish
         action = await click_any()
         if action == "publish":
@@ -504,7 +725,7 @@ class SimpleFacebookPoster:
                 action = await click_any()
                 if action != "publish":
                     break
-            await asyncio.sleep(0.8)
+            await next_step_rendered()
             if prefer_no_groups:
                 await self._clear_groups_if_any()
             action = await click_any()
@@ -514,3 +735,47 @@ class SimpleFacebookPoster:
 
         self.log("Publish not confirmed; leaving window open for manual review.")
         return False, None
+
+    # ---------- live listing actions ----------
+    async def mark_listing_sold(self) -> bool:
+        """Clicks "Mark as sold" on the listing page that is currently open."""
+        if not await self._try_click_any([
+            self.page.get_by_role("button", name="Mark as sold"),
+            self.page.get_by_text("Mark as sold", exact=False).first,
+            "button:has-text('Mark as sold')",
+        ], timeout=3000, field="Mark as sold"):
+            self.log("Mark as sold button not found")
+            return False
+        await asyncio.sleep(0.6)
+        self.log("Listing marked as sold")
+        return True
+
+    async def delete_current_listing(self) -> bool:
+        """Clicks "Delete listing" on the open listing page and confirms the dialog."""
+        if not await self._try_click_any([
+            self.page.get_by_role("button", name="Delete listing"),
+            self.page.get_by_text("Delete listing", exact=False).first,
+            "button:has-text('Delete listing')",
+        ], timeout=3000, field="Delete listing"):
+            self.log("Delete listing button not found")
+            return False
+        # only inside the dialog: the "Delete listing" trigger behind it must never win the race
+        dialog = self.page.locator('[role="dialog"]:visible').last
+        try:
+            await dialog.wait_for(state="visible", timeout=3000)
+        except:
+            self.log("Delete confirmation dialog not found")
+            return False
+        if not await self._try_click_any([
+            lambda s: s.get_by_role("button", name="Delete", exact=True),
+            lambda s: s.get_by_text("Delete", exact=True),
+        ], scope=dialog, timeout=3000, field="Delete confirm", settle=0):
+            self.log("Delete confirmation not found")
+            return False
+        try:
+            await dialog.wait_for(state="hidden", timeout=5000)
+        except:
+            self.log("Delete confirmation dialog did not close; listing may not be deleted")
+            return False
+        self.log("Listing deleted")
+        return True
@@ -0,0 +1,268 @@
+﻿# image_cache.py
+import os, sqlite3, threading, time
+from pathlib import Path
+
+FORMAT_EXT = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+class ImageCache:
+    """
+    Content-addressed store for listing images, shared by every account and campaign.
+
+    Layout under `root` (assets/image-cache):
+      blobs/<sha[:2]>/<sha256>.<ext>   verified image bytes, stored once per content
+      prepared/<sha[:2]>/<sha256>-<variant>.jpg   resized upload copies (image_prep.py)
+      incoming/*.tmp                   downloads being streamed in
+      index.sqlite                     urls(url -> sha256 + ETag/Last-Modified/length),
+                                       blobs(sha256 -> path, bytes, last_used),
+                                       derived(sha256 + variant -> path, bytes, phash),
+                                       stats(hits, misses, bytes_reclaimed)
+
+    A URL is fetched at most once; two URLs serving the same bytes share one blob.
+    Downloads go through image_downloader.ImageDownloader.fetch_listing().
+    """
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.blob_root = self.root / "blobs"
+        self.prepared_root = self.root / "prepared"
+        self.incoming_root = self.root / "incoming"  # downloads in progress
+        self.index_path = self.root / "index.sqlite"
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript("""
+          CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            bytes INTEGER,
+            created_at INTEGER,
+            last_used INTEGER
+          );
+          CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            fetched_at INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            content_length INTEGER,
+            checked_at INTEGER
+          );
+          CREATE INDEX IF NOT EXISTS idx_urls_sha256 ON urls(sha256);
+          CREATE TABLE IF NOT EXISTS derived (
+            sha256 TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            path TEXT NOT NULL,
+            bytes INTEGER,
+            phash TEXT,
+            PRIMARY KEY (sha256, variant)
+          );
+          CREATE TABLE IF NOT EXISTS stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+          );
+        """)
+        if "last_used" not in [r[1] for r in conn.execute("PRAGMA table_info(blobs)").fetchall()]:
+            conn.execute("ALTER TABLE blobs ADD COLUMN last_used INTEGER")
+            conn.execute("UPDATE blobs SET last_used=created_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs(last_used)")
+        if "phash" not in [r[1] for r in conn.execute("PRAGMA table_info(derived)").fetchall()]:
+            conn.execute("ALTER TABLE derived ADD COLUMN phash TEXT")
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(urls)").fetchall()]
+        for col, typ in (("etag", "TEXT"), ("last_modified", "TEXT"), ("content_length", "INTEGER"),
+                         ("checked_at", "INTEGER")):
+            if col not in cols: conn.execute(f"ALTER TABLE urls ADD COLUMN {col} {typ}")
+        conn.commit(); conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    # ---------- lookup ----------
+    def lookup(self, url: str) -> Path | None:
+        """Cached file for `url`, or None when unknown or the blob went missing. Counts hits/misses."""
+        conn = self._connect()
+        row = conn.execute("""
+          SELECT b.path, b.bytes, b.sha256 FROM urls u JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?
+        """, (url,)).fetchone()
+        p = Path(row[0]) if row else None
+        try:
+            ok = bool(p) and p.stat().st_size == row[1]
+        except OSError:
+            ok = False
+        if ok: conn.execute("UPDATE blobs SET last_used=? WHERE sha256=?", (int(time.time()), row[2]))
+        else: conn.execute("DELETE FROM urls WHERE url=?", (url,))
+        self._bump(conn, "hits" if ok else "misses")
+        conn.commit(); conn.close()
+        return p if ok else None
+
+    def touch_paths(self, paths):
+        """Marks the blobs behind cached files (originals or prepared copies) as just used."""
+        shas = {self.sha_of(p) for p in paths} - {None}
+        if not shas: return
+        conn = self._connect()
+        conn.executemany("UPDATE blobs SET last_used=? WHERE sha256=?", [(int(time.time()), s) for s in shas])
+        conn.commit(); conn.close()
+
+    def validators(self, url: str) -> dict:
+        """Conditional-request headers for a cached `url` (empty when nothing is stored)."""
+        conn = self._connect()
+        row = conn.execute("SELECT etag, last_modified FROM urls WHERE url=?", (url,)).fetchone()
+        conn.close()
+        h = {}
+        if row and row[0]: h["If-None-Match"] = row[0]
+        if row and row[1]: h["If-Modified-Since"] = row[1]
+        return h
+
+    def mark_checked(self, url: str, etag=None, last_modified=None):
+        """Records a 304: the stored copy is still current."""
+        conn = self._connect()
+        conn.execute("""
+          UPDATE urls SET checked_at=?, etag=COALESCE(?, etag), last_modified=COALESCE(?, last_modified) WHERE url=?
+        """, (int(time.time()), etag, last_modified, url))
+        conn.commit(); conn.close()
+
+    def forget(self, url: str):
+        conn = self._connect()
+        conn.execute("DELETE FROM urls WHERE url=?", (url,))
+        conn.commit(); conn.close()
+
+    def sha_of(self, path) -> str | None:
+        """Source hash of a blob or prepared path (its file name), None for files outside the cache."""
+        p = Path(path)
+        if p.is_relative_to(self.blob_root): return p.stem
+        if p.is_relative_to(self.prepared_root): return p.stem.split("-", 1)[0]
+        return None
+
+    def derived_path(self, sha: str, variant: str) -> Path | None:
+        conn = self._connect()
+        row = conn.execute("SELECT path, bytes FROM derived WHERE sha256=? AND variant=?", (sha, variant)).fetchone()
+        conn.close()
+        if not row: return None
+        p = Path(row[0])
+        try:
+            if p.stat().st_size == row[1]: return p
+        except OSError:
+            pass
+        return None
+
+    def add_derived(self, sha: str, variant: str, path, size: int, phash: str | None = None):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO derived (sha256, variant, path, bytes, phash) VALUES (?,?,?,?,?)",
+                     (sha, variant, str(path), size, phash))
+        conn.commit(); conn.close()
+
+    def phash_of(self, path) -> str | None:
+        """Stored perceptual hash (image_dedupe.dhash) for a cached file, if one was computed."""
+        sha = self.sha_of(path)
+        if not sha: return None
+        conn = self._connect()
+        row = conn.execute("SELECT phash FROM derived WHERE sha256=? AND phash IS NOT NULL LIMIT 1", (sha,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def set_phash(self, sha: str, phash: str):
+        conn = self._connect()
+        conn.execute("UPDATE derived SET phash=? WHERE sha256=?", (phash, sha))
+        conn.commit(); conn.close()
+
+    def url_of(self, path) -> str | None:
+        """One source URL of a cached file (for reports)."""
+        sha = self.sha_of(path)
+        if not sha: return None
+        conn = self._connect()
+        row = conn.execute("SELECT url FROM urls WHERE sha256=? LIMIT 1", (sha,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    # ---------- store ----------
+    def store_file(self, url: str, tmp: Path, sha: str, ext: str, etag=None, last_modified=None,
+                   content_length=None) -> Path:
+        """
+        Moves an already verified and hashed download (image_downloader) into its blob
+        and maps `url` to it, keeping the response validators for later revalidation.
+        """
+        dest = self.blob_root / sha[:2] / f"{sha}{ext}"
+        size = Path(tmp).stat().st_size
+        with self._lock:
+            if dest.exists() and dest.stat().st_size == size:
+                Path(tmp).unlink(missing_ok=True)
+            else:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, dest)
+            now = int(time.time())
+            conn = self._connect()
+            conn.execute("INSERT OR IGNORE INTO blobs (sha256, path, bytes, created_at) VALUES (?,?,?,?)",
+                         (sha, str(dest), size, now))
+            conn.execute("UPDATE blobs SET path=?, bytes=?, last_used=? WHERE sha256=?", (str(dest), size, now, sha))
+            conn.execute("""
+              INSERT OR REPLACE INTO urls (url, sha256, fetched_at, etag, last_modified, content_length, checked_at)
+              VALUES (?,?,?,?,?,?,?)
+            """, (url, sha, now, etag, last_modified, content_length or size, now))
+            conn.commit(); conn.close()
+        return dest
+
+    # ---------- size & eviction (policy lives in cache_manager.py) ----------
+    def total_bytes(self) -> int:
+        conn = self._connect()
+        n = conn.execute("""
+          SELECT COALESCE((SELECT SUM(bytes) FROM blobs), 0) + COALESCE((SELECT SUM(bytes) FROM derived), 0)
+        """).fetchone()[0]
+        conn.close()
+        return n
+
+    def lru(self) -> list[tuple[str, int]]:
+        """(sha256, bytes incl. prepared copies) for every blob, least recently used first."""
+        conn = self._connect()
+        rows = conn.execute("""
+          SELECT b.sha256, COALESCE(b.bytes, 0) + COALESCE((SELECT SUM(d.bytes) FROM derived d WHERE d.sha256 = b.sha256), 0)
+          FROM blobs b ORDER BY COALESCE(b.last_used, b.created_at, 0) ASC
+        """).fetchall()
+        conn.close()
+        return rows
+
+    def shas_for_urls(self, urls) -> set[str]:
+        conn = self._connect()
+        out = set()
+        for u in urls:
+            r = conn.execute("SELECT sha256 FROM urls WHERE url=?", (u,)).fetchone()
+            if r: out.add(r[0])
+        conn.close()
+        return out
+
+    def evict(self, sha: str) -> int:
+        """Deletes a blob, its prepared copies and the URLs pointing at it; returns bytes freed."""
+        conn = self._connect()
+        paths = [r[0] for r in conn.execute("SELECT path FROM blobs WHERE sha256=? UNION ALL "
+                                            "SELECT path FROM derived WHERE sha256=?", (sha, sha)).fetchall()]
+        freed = 0
+        for p in paths:
+            try:
+                freed += Path(p).stat().st_size
+                Path(p).unlink()
+            except OSError:
+                pass
+        conn.execute("DELETE FROM derived WHERE sha256=?", (sha,))
+        conn.execute("DELETE FROM urls WHERE sha256=?", (sha,))
+        conn.execute("DELETE FROM blobs WHERE sha256=?", (sha,))
+        self._bump(conn, "bytes_reclaimed", freed)
+        conn.commit(); conn.close()
+        return freed
+
+    # ---------- stats ----------
+    @staticmethod
+    def _bump(conn, key: str, n: int = 1):
+        conn.execute("INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + ?",
+                     (key, n, n))
+
+    def add_reclaimed(self, n: int):
+        conn = self._connect()
+        self._bump(conn, "bytes_reclaimed", n)
+        conn.commit(); conn.close()
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        s = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        blobs = conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        conn.close()
+        hits, misses = s.get("hits", 0), s.get("misses", 0)
+        return {"blobs": blobs, "bytes": self.total_bytes(), "hits": hits, "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+                "bytes_reclaimed": s.get("bytes_reclaimed", 0)}
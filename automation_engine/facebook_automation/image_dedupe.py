@@ -0,0 +1,96 @@
+﻿# image_dedupe.py
+import json, math
+from collections import Counter
+from pathlib import Path
+
+DUPLICATE_DISTANCE = 6        # dHash bits that may differ for two photos to count as the same shot
+PLACEHOLDER_MIN_LISTINGS = 5  # the same picture on this many listings of a feed...
+PLACEHOLDER_MIN_SHARE = 0.2   # ...that are also this share of its listings with photos is a stock/"coming soon" image
+
+def dhash(im, size: int = 8) -> str:
+    """64-bit difference hash of a PIL image as 16 hex chars (survives resizing and recompression)."""
+    g = im.convert("L").resize((size + 1, size))
+    px = list(g.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            bits = (bits << 1) | (px[row * (size + 1) + col] > px[row * (size + 1) + col + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+def distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def near(h: str, hashes, max_distance: int = DUPLICATE_DISTANCE) -> str | None:
+    return next((x for x in hashes if distance(h, x) <= max_distance), None)
+
+class Placeholders:
+    """
+    Known placeholder hashes, kept in image-cache/placeholders.json and grown by frequent().
+    Each hash remembers the source (campaign id) that taught it, so forget() can take back
+    what one feed taught; hashes from the old list format have source None.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try: data = json.loads(self.path.read_text(encoding="utf-8"))
+        except: data = {}
+        self.sources = dict.fromkeys(data) if isinstance(data, list) else dict(data)  # hash -> source
+
+    @property
+    def hashes(self) -> set[str]:
+        return set(self.sources)
+
+    def learn(self, hashes, source=None) -> set[str]:
+        """Adds the hashes not known yet, recorded as taught by `source`; returns them."""
+        new = set(hashes) - self.sources.keys()
+        if new:
+            self.sources.update(dict.fromkeys(new, source))
+            self._save()
+        return new
+
+    def forget(self, source) -> int:
+        """Drops every hash `source` taught; returns how many."""
+        gone = [h for h, s in self.sources.items() if s == source]
+        for h in gone: del self.sources[h]
+        if gone: self._save()
+        return len(gone)
+
+    def _save(self):
+        try: self.path.write_text(json.dumps(dict(sorted(self.sources.items())), indent=1), encoding="utf-8")
+        except Exception as e: print(f"[dedupe] could not save placeholders: {e}")
+
+    def match(self, h: str) -> bool:
+        return near(h, self.sources) is not None
+
+def frequent(per_listing: list[list[str]], min_listings: int = PLACEHOLDER_MIN_LISTINGS,
+             min_share: float = PLACEHOLDER_MIN_SHARE) -> set[str]:
+    """
+    Hashes that show up on at least `min_listings` different listings and on at least
+    `min_share` of the listings that have photos, so a photo a few listings of a big
+    feed happen to share isn't taken for a placeholder.
+    """
+    listings = [{h for h in hashes if h} for hashes in per_listing]
+    listings = [hs for hs in listings if hs]
+    need = max(min_listings, math.ceil(min_share * len(listings)))
+    seen = Counter(h for hs in listings for h in hs)
+    return {h for h, n in seen.items() if n >= need}
+
+def dedupe_listing(files: list, hashes: list[str | None], placeholders: Placeholders) -> tuple[list, list[dict]]:
+    """
+    Drops placeholders and near-duplicates (the first copy stays) from one listing's
+    images. Returns (kept files, removed entries {"index", "reason", "of"?}).
+    A listing made only of placeholders keeps its first image so it can still post.
+    """
+    kept, kept_hashes, removed = [], [], []
+    for i, (f, h) in enumerate(zip(files, hashes)):
+        if h is None:
+            kept.append(f); continue
+        if placeholders.match(h):
+            removed.append({"index": i, "reason": "placeholder"}); continue
+        dup = near(h, kept_hashes)
+        if dup is not None:
+            removed.append({"index": i, "reason": "duplicate", "of": hashes.index(dup)}); continue
+        kept.append(f); kept_hashes.append(h)
+    if not kept and files:
+        kept = [files[0]]
+        removed = [r for r in removed if r["index"] != 0]
+    return kept, removed
@@ -0,0 +1,259 @@
+﻿# image_downloader.py
+import asyncio, hashlib, os, random, threading, time, weakref
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from image_cache import FORMAT_EXT
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+MAX_IMAGE_BYTES = 25 * 2**20
+MAX_PIXELS = 60_000_000
+MAX_HEADER = 512 * 1024  # the header (format, size) must be readable within this much data
+CHUNK = 64 * 1024
+MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")  # + RIFF....WEBP, checked below
+
+class ImageRejected(Exception):
+    """A response that is not a usable image; `reason` is the code recorded on the listing."""
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}{f' ({detail})' if detail else ''}")
+        self.reason = reason
+
+class Download:
+    """A 200 streamed to `tmp` (hashed and decoded on the way), or a 304 (`tmp` None)."""
+    __slots__ = ("status", "headers", "tmp", "sha", "ext", "size")
+
+    def __init__(self, status, headers, tmp=None, sha=None, ext=None, size=0):
+        self.status, self.headers, self.tmp, self.sha, self.ext, self.size = status, headers, tmp, sha, ext, size
+
+def looks_like_image(head: bytes) -> bool:
+    return head.startswith(MAGIC) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+
+class ImageDownloader:
+    """
+    Downloads listing images without blocking the event loop.
+
+    One keep-alive requests.Session (pooled per host) is shared by every caller;
+    the blocking calls run on a small thread pool. At most `per_host` requests
+    hit one host at a time, failures are retried with exponential backoff, and
+    fetch_listing() gives up on whatever is still outstanding at its deadline. A
+    download given up on keeps its host slot until its thread has actually stopped,
+    which it does at the next chunk.
+
+    Bodies are streamed to a temp file in the cache in CHUNK-sized pieces: the
+    Content-Type, the magic bytes of the first chunk and `max_bytes` are checked
+    as the data arrives, and the header is parsed incrementally (format and
+    dimensions, MAX_PIXELS) until it is complete, so a bad URL (HTML error page,
+    huge file) is dropped early and never buffered whole. The finished file's
+    structure is then verified from disk without a full-size pixel buffer (JPEGs
+    decode at 1/8 scale); the one full decode is image_prep's.
+    """
+    def __init__(self, *, per_host: int = 4, max_workers: int = 16, timeout: float = 20,
+                 retries: int = 3, backoff: float = 0.5, max_bytes: int = MAX_IMAGE_BYTES):
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) CrazyPoster/1.0"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="img-dl")
+        self._slots = weakref.WeakKeyDictionary()  # loop -> {host: Semaphore}
+        self.not_modified = 0  # 304s answered during revalidation
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        per_loop = self._slots.setdefault(asyncio.get_running_loop(), {})
+        host = urlparse(url).netloc.lower()
+        if host not in per_loop: per_loop[host] = asyncio.Semaphore(self.per_host)
+        return per_loop[host]
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    @staticmethod
+    def _parse_header(head: bytearray) -> str | None:
+        """Format once the header in `head` parses (nothing is decoded), None while it is still short."""
+        try:
+            with Image.open(BytesIO(head)) as im:
+                fmt, w, h = im.format, im.width, im.height
+        except Exception as e:
+            if len(head) >= MAX_HEADER: raise ImageRejected("corrupt", str(e)[:80])
+            return None
+        if w * h > MAX_PIXELS:
+            raise ImageRejected("too_large", f"{w}x{h}")
+        return fmt
+
+    @staticmethod
+    def _verify(path: Path, fmt: str, tail: bytes):
+        """Structure check of a finished download; raises ImageRejected("corrupt")."""
+        try:
+            with Image.open(path) as im:
+                im.verify()  # chunk layout and checksums, no pixels
+            if fmt == "JPEG":
+                with Image.open(path) as im:
+                    im.draft("RGB", (im.width // 8, im.height // 8))  # DCT scaling: 1/64 of the pixels
+                    im.load()  # raises for a cut-off JPEG, which verify() lets through
+        except Exception as e:
+            raise ImageRejected("corrupt", str(e)[:80])
+        if fmt == "GIF" and b";" not in tail:  # trailer; verify() doesn't read GIF frames
+            raise ImageRejected("corrupt", "truncated")
+
+    def _stream(self, url: str, headers: dict | None, timeout: float, incoming: Path,
+                cancel: threading.Event | None = None) -> Download:
+        """Blocking: one GET streamed to a temp file under `incoming`. Raises ImageRejected; stops once `cancel` is set."""
+        stop_at = time.monotonic() + timeout
+        with self.session.get(url, timeout=timeout, headers=headers, stream=True) as r:
+            if r.status_code == 304 and headers:
+                return Download(304, r.headers)
+            if r.status_code != 200:
+                raise ImageRejected(f"http_{r.status_code}")
+            ctype = (r.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            if ctype and not ctype.startswith("image/") and ctype != "application/octet-stream":
+                raise ImageRejected("not_image", ctype)
+            length = r.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise ImageRejected("too_large", f"{int(length)} bytes")
+            incoming.mkdir(parents=True, exist_ok=True)
+            tmp = incoming / f"{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+            sha, head, tail, size, fmt = hashlib.sha256(), bytearray(), b"", 0, None
+            try:
+                with open(tmp, "wb") as f:
+                    for chunk in r.iter_content(CHUNK):
+                        if not chunk: continue
+                        if size == 0 and not looks_like_image(chunk[:12]):
+                            raise ImageRejected("bad_magic", ctype or "no content-type")
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ImageRejected("too_large", f"> {self.max_bytes} bytes")
+                        if time.monotonic() > stop_at:
+                            raise ImageRejected("timeout")
+                        if cancel is not None and cancel.is_set():
+                            raise ImageRejected("deadline")
+                        f.write(chunk)
+                        sha.update(chunk)
+                        tail = (tail + chunk)[-16:]
+                        if fmt is None:
+                            head += chunk
+                            fmt = self._parse_header(head)
+                            if fmt: head = None
+                if size == 0:
+                    raise ImageRejected("empty")
+                if fmt is None:
+                    raise ImageRejected("corrupt", "incomplete header")
+                self._verify(tmp, fmt, tail)
+                return Download(200, r.headers, tmp, sha.hexdigest(), FORMAT_EXT.get(fmt, ".jpg"), size)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+
+    async def _stream_in_slot(self, url: str, headers: dict | None, timeout: float, incoming: Path) -> Download:
+        """
+        _stream on the thread pool under the host's slot. The slot is given back when
+        the thread finishes, not when the caller is cancelled (fetch_listing's
+        deadline), so abandoned downloads still count against `per_host`.
+        """
+        slot = self._host_slot(url)
+        await slot.acquire()
+        cancel = threading.Event()
+        fut = self._run(self._stream, url, headers, timeout, incoming, cancel)
+        def done(f):
+            slot.release()
+            if not f.cancelled(): f.exception()  # retrieved; nobody awaits an abandoned download
+        fut.add_done_callback(done)
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    async def get(self, url: str, incoming: Path, *, deadline: float | None = None, headers: dict | None = None,
+                  log=print) -> Download:
+        """
+        The streamed 200 (or, for a conditional request, 304). Retries transient
+        failures; raises ImageRejected with the final reason code otherwise.
+        """
+        loop = asyncio.get_running_loop()
+        reason = "deadline"
+        for attempt in range(1, self.retries + 1):
+            left = self.timeout if deadline is None else min(self.timeout, deadline - loop.time())
+            if left <= 0: break
+            try:
+                return await self._stream_in_slot(url, headers, left, incoming)
+            except ImageRejected as e:
+                if e.reason not in {f"http_{s}" for s in RETRY_STATUS}: raise
+                reason = e.reason
+            except requests.RequestException as e:
+                reason = "timeout" if isinstance(e, requests.Timeout) else "network"
+                log(f"{type(e).__name__}: {url}")
+            if attempt < self.retries:
+                pause = self.backoff * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                if deadline is not None and loop.time() + pause >= deadline: break
+                log(f"Retry {attempt}/{self.retries - 1} in {pause:.1f}s ({reason}): {url}")
+                await asyncio.sleep(pause)
+        raise ImageRejected(reason, "gave up")
+
+    async def fetch(self, url: str, cache, *, deadline: float | None = None, revalidate: bool = False,
+                    rejects: list | None = None, log=print) -> Path | None:
+        """
+        Cached file for `url`, downloading and storing it in `cache` (ImageCache) on a miss.
+        revalidate=True asks the server with If-None-Match / If-Modified-Since whether a
+        cached copy is still current; a 304 keeps it, a 200 replaces it.
+        A URL that yields no file is appended to `rejects` as {"url", "reason"}.
+        """
+        p = await self._run(cache.lookup, url)
+        if p and not revalidate: return p
+        headers = await self._run(cache.validators, url) if p else None
+        try:
+            d = await self.get(url, cache.incoming_root, deadline=deadline, headers=headers or None, log=log)
+        except ImageRejected as e:
+            if p: return p  # source unreachable or broken now: the copy we have beats none
+            log(f"Skip image ({e}): {url}")
+            if rejects is not None: rejects.append({"url": url, "reason": e.reason})
+            return None
+        if d.status == 304:
+            await self._run(cache.mark_checked, url, d.headers.get("ETag"), d.headers.get("Last-Modified"))
+            self.not_modified += 1
+            return p
+        path = await self._run(cache.store_file, url, d.tmp, d.sha, d.ext, d.headers.get("ETag"),
+                               d.headers.get("Last-Modified"), d.size)
+        if p and path != p: log(f"Image changed at source, re-cached: {url}")
+        return path
+
+    async def fetch_listing(self, items: list[str], cache, *, deadline: float = 90, revalidate: bool = False,
+                            rejects: list | None = None, log=print) -> list[str]:
+        """
+        Local paths for one listing's `items`, in order. Local files pass through,
+        URLs are fetched concurrently; anything not done after `deadline` seconds
+        (or that failed) is dropped. See fetch() for `revalidate` and `rejects`.
+        """
+        loop = asyncio.get_running_loop()
+        until = loop.time() + deadline
+        tasks = {}
+        for i, it in enumerate(items):
+            if str(it).lower().startswith("http"):
+                tasks[i] = asyncio.ensure_future(self.fetch(it, cache, deadline=until, revalidate=revalidate,
+                                                            rejects=rejects, log=log))
+        if tasks:
+            _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+            for t in pending: t.cancel()
+            if pending: log(f"Image deadline ({deadline:.0f}s) hit, {len(pending)} image(s) dropped")
+            if pending and rejects is not None:
+                rejects.extend({"url": items[i], "reason": "deadline"} for i, t in tasks.items() if t in pending)
+        out = []
+        for i, it in enumerate(items):
+            t = tasks.get(i)
+            if t is None:
+                if Path(it).is_file(): out.append(str(it))
+            elif t.done() and not t.cancelled() and t.exception() is None and t.result():
+                out.append(str(t.result()))
+        return out
+
+downloader = ImageDownloader()
@@ -0,0 +1,143 @@
+﻿# image_prefetch.py
+import asyncio
+from pathlib import Path
+
+from image_cache import ImageCache
+from image_downloader import downloader
+from image_prep import preprocessor_for
+
+class ImagePrefetcher:
+    """
+    Runs ahead of the browser: fetches and prepares the images of the next
+    `depth` listings of a run while the sessions are busy posting earlier ones.
+
+      pf = ImagePrefetcher(cache_root, depth=3); pf.start([(listing_id, urls), ...])
+      files, rejects = await pf.take(listing_id)   # usually already on disk
+      await pf.close()
+
+    At most `depth` listings are fetched or waiting to be taken at once, and no
+    new listing starts while the prepared-but-untaken files exceed `max_bytes`.
+    take() of a listing the producer hasn't reached yet fetches it right away.
+
+    buffers=True hands out in-memory set_input_files() payloads instead of paths;
+    they stay here for retries of the listing until release(key). release() also
+    frees the place of a listing that was never taken (every attempt failed early).
+    """
+    def __init__(self, cache_root: Path, *, depth: int = 3, max_bytes: int = 256 * 2**20, buffers: bool = False,
+                 log=print):
+        self.cache = ImageCache(cache_root)
+        self.buffers = buffers
+        self.depth = max(1, depth)
+        self.max_bytes = max_bytes
+        self.log = log
+        self.bytes_ahead = 0
+        self._results: dict = {}   # key -> Future[(files, rejects)]
+        self._sizes: dict = {}     # key -> bytes counted in bytes_ahead until taken
+        self._taken: set = set()
+        self._held: set = set()     # keys holding a pipeline slot (and bytes_ahead) until taken or released
+        self._dropped: set = set()  # released while still being fetched
+        self._slots = asyncio.Semaphore(self.depth)
+        self._room = asyncio.Condition()
+        self._producer = None
+        self.hits = 0    # take() found the images ready
+        self.waits = 0   # take() had to wait for them
+
+    def start(self, jobs: list):
+        self._producer = asyncio.ensure_future(self._produce(list(jobs)))
+
+    async def _fetch(self, items: list[str]):
+        rejects = []
+        files = await downloader.fetch_listing(items, self.cache, rejects=rejects, log=self.log)
+        files = await preprocessor_for(self.cache).prepare_many(files, log=self.log, buffers=self.buffers)
+        return files, rejects
+
+    @staticmethod
+    def _size(files) -> int:
+        return sum(len(f["buffer"]) if isinstance(f, dict) else Path(f).stat().st_size
+                   for f in files or [] if isinstance(f, dict) or Path(f).is_file())
+
+    async def _produce(self, jobs: list):
+        for key, items in jobs:
+            if key in self._results: continue  # claimed by take() already
+            await self._slots.acquire()
+            async with self._room:
+                await self._room.wait_for(lambda: self.bytes_ahead <= self.max_bytes)
+            if key in self._results:
+                self._slots.release(); continue
+            fut = self._results[key] = asyncio.get_running_loop().create_future()
+            self._held.add(key)
+            try:
+                files, rejects = await self._fetch(items)
+            except asyncio.CancelledError:
+                fut.set_result((None, []))  # close(): a later take() downloads inline
+                raise
+            except Exception as e:
+                self.log(f"Prefetch failed for {key}: {e}")
+                files, rejects = None, []
+            if key in self._dropped:
+                self._dropped.discard(key)
+                fut.set_result((None, []))
+                await self._free(key); continue
+            self._sizes[key] = self._size(files)
+            self.bytes_ahead += self._sizes[key]
+            fut.set_result((files, rejects))
+
+    async def _free(self, key):
+        """Gives back the slot and bytes `key` held in the pipeline (once)."""
+        if key not in self._held: return
+        self._held.discard(key)
+        self.bytes_ahead -= self._sizes.pop(key, 0)
+        self._slots.release()
+        async with self._room:
+            self._room.notify_all()
+
+    async def take(self, key, items: list[str] | None = None):
+        """
+        (files, rejects) for `key`; files is None when prefetching failed (download
+        inline instead). Taking a listing frees its place in the pipeline.
+        """
+        fut = self._results.get(key)
+        if fut is None:
+            if items is None: return None, []
+            fut = self._results[key] = asyncio.get_running_loop().create_future()
+            self._taken.add(key)
+            self.waits += 1
+            try: fut.set_result(await self._fetch(items))
+            except Exception as e:
+                self.log(f"Prefetch failed for {key}: {e}")
+                fut.set_result((None, []))
+            return fut.result()
+        first = key not in self._taken  # retries of a listing take it again
+        if first and fut.done(): self.hits += 1
+        elif first: self.waits += 1
+        result = await fut
+        if first:
+            self._taken.add(key)
+            await self._free(key)
+        return result
+
+    async def release(self, key):
+        """
+        Drops what is kept for `key` once the listing is finished (posted or given
+        up), taken or not; a listing still being fetched is dropped when it lands.
+        """
+        fut = self._results.get(key)
+        if fut is None: return
+        if not fut.done():
+            if key in self._held: self._dropped.add(key)
+            return
+        await self._free(key)
+        done = asyncio.get_running_loop().create_future()
+        done.set_result((None, []))  # a late take() downloads inline again
+        self._results[key] = done
+
+    async def close(self):
+        if self._producer and not self._producer.done():
+            self._producer.cancel()
+            try: await self._producer
+            except asyncio.CancelledError: pass
+        for fut in self._results.values():
+            if not fut.done(): fut.set_result((None, []))
+
+    def format_stats(self) -> str:
+        return f"Prefetch: {self.hits} listing(s) had images ready, {self.waits} waited"
@@ -0,0 +1,152 @@
+﻿# image_prep.py
+import asyncio, hashlib, os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from image_dedupe import dhash
+
+MAX_SIDE = 2048   # Marketplace never shows listing photos larger than this
+QUALITY = 85
+MIME_BY_EXT = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp", ".gif": "image/gif"}
+
+def variant_name(max_side: int, quality: int) -> str:
+    return f"{max_side}q{quality}"
+
+def payload(name: str, data: bytes) -> dict:
+    """In-memory file for Playwright's set_input_files()."""
+    return {"name": name, "mimeType": MIME_BY_EXT.get(Path(name).suffix.lower(), "image/jpeg"), "buffer": data}
+
+def prepare_file(src: str, out_root: str, max_side: int = MAX_SIDE, quality: int = QUALITY,
+                 sha: str | None = None, want_bytes: bool = False) -> tuple[str, str, int, bytes | None, str]:
+    """
+    Runs in a worker process. Decodes `src` once, applies the EXIF orientation,
+    fits it inside max_side x max_side, re-encodes as a progressive JPEG without
+    metadata and writes out_root/<sha[:2]>/<sha>-<variant>.jpg.
+    Returns (source sha256, output path, output size, output bytes if want_bytes,
+    perceptual hash); an existing output is reused.
+    """
+    data = Path(src).read_bytes()
+    sha = sha or hashlib.sha256(data).hexdigest()
+    dest = Path(out_root) / sha[:2] / f"{sha}-{variant_name(max_side, quality)}.jpg"
+    if dest.exists() and dest.stat().st_size:
+        out = dest.read_bytes() if want_bytes else None
+        return sha, str(dest), dest.stat().st_size, out, phash_file(str(dest))
+    with Image.open(BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ("RGBA", "LA", "P"):
+            im = im.convert("RGBA")
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        elif im.mode != "RGB":
+            im = im.convert("RGB")
+        im.thumbnail((max_side, max_side), Image.LANCZOS)
+        ph = dhash(im)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        buf = BytesIO()
+        im.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)  # no exif/icc passed -> stripped
+    out = buf.getvalue()
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(out)
+    os.replace(tmp, dest)
+    return sha, str(dest), len(out), out if want_bytes else None, ph
+
+def phash_file(path: str) -> str:
+    """Perceptual hash of an image file, decoding JPEGs at reduced size."""
+    with Image.open(path) as im:
+        im.draft("L", (64, 64))
+        return dhash(ImageOps.exif_transpose(im))
+
+class ImagePreprocessor:
+    """
+    Shrinks cached images before upload on a process pool (decode/resize is CPU
+    bound). Output lives in the image cache under prepared/, keyed by the source
+    hash plus the size/quality variant, and is recorded in the cache index.
+    The pool starts on first use.
+    """
+    def __init__(self, cache, *, max_side: int = MAX_SIDE, quality: int = QUALITY, workers: int | None = None):
+        self.cache = cache
+        self.max_side = max_side
+        self.quality = quality
+        self.variant = variant_name(max_side, quality)
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor = None
+
+    @staticmethod
+    def _index(fn, *args):
+        # cache index reads/writes are sqlite calls: keep them off the event loop (the app's browser loop)
+        return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def prepare_many(self, paths: list[str], log=print, buffers: bool = False) -> list:
+        """
+        Prepared files for `paths`, in order; an image that can't be processed keeps its original.
+        buffers=True returns set_input_files() payloads ({name, mimeType, buffer}) instead of
+        paths, with the bytes handed back by the worker rather than re-read from disk.
+        """
+        loop = asyncio.get_running_loop()
+        prepared_root = str(self.cache.prepared_root)
+
+        def as_result(path: str, data: bytes | None = None):
+            if not buffers: return path
+            return payload(Path(path).name, data if data is not None else Path(path).read_bytes())
+
+        async def one(p: str):
+            if Path(p).is_relative_to(self.cache.prepared_root):
+                return await loop.run_in_executor(None, as_result, p) if buffers else p
+            sha = self.cache.sha_of(p)
+            known = await self._index(self.cache.derived_path, sha, self.variant) if sha else None
+            if known: return await loop.run_in_executor(None, as_result, str(known)) if buffers else str(known)
+            try:
+                sha, dest, size, data, ph = await loop.run_in_executor(
+                    self._pool(), prepare_file, p, prepared_root, self.max_side, self.quality, sha, buffers)
+                await self._index(self.cache.add_derived, sha, self.variant, dest, size, ph)
+                return as_result(dest, data)
+            except Exception as e:
+                log(f"Preprocess failed, uploading original {p}: {e}")
+                try: return await loop.run_in_executor(None, as_result, p) if buffers else p
+                except OSError: return None
+
+        out = [r for r in await asyncio.gather(*(one(p) for p in paths)) if r is not None]
+        before = sum(Path(p).stat().st_size for p in paths if Path(p).is_file())
+        after = sum(len(r["buffer"]) if buffers else Path(r).stat().st_size for r in out if buffers or Path(r).is_file())
+        if before: log(f"Images prepared: {before // 1024} KB -> {after // 1024} KB" + (" (in memory)" if buffers else ""))
+        return out
+
+    async def phashes(self, paths: list[str]) -> list[str | None]:
+        """Perceptual hash per file (from the cache index when known, else computed on the pool)."""
+        loop = asyncio.get_running_loop()
+
+        async def one(p: str):
+            h = await self._index(self.cache.phash_of, p)
+            if h: return h
+            try:
+                h = await loop.run_in_executor(self._pool(), phash_file, p)
+            except Exception:
+                return None
+            sha = self.cache.sha_of(p)
+            if sha and Path(p).is_relative_to(self.cache.prepared_root):
+                await self._index(self.cache.set_phash, sha, h)
+            return h
+
+        return list(await asyncio.gather(*(one(p) for p in paths)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+_preprocessors: dict[str, ImagePreprocessor] = {}
+
+def preprocessor_for(cache) -> ImagePreprocessor:
+    """One preprocessor (and process pool) per cache root for the whole process."""
+    key = str(cache.root)
+    if key not in _preprocessors: _preprocessors[key] = ImagePreprocessor(cache)
+    return _preprocessors[key]
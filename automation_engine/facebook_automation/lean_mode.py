@@ -0,0 +1,96 @@
+﻿# lean_mode.py
+import re
+from collections import Counter
+
+# Nothing the Marketplace composer needs arrives as these resource types.
+BLOCKED_RESOURCE_TYPES = ["font", "media", "texttrack", "eventsource", "manifest"]
+
+# Trackers, ads and client-side logging beacons.
+BLOCKED_URL_PATTERNS = [
+    r"doubleclick\.net", r"googlesyndication\.com", r"google-analytics\.com", r"googletagmanager\.com",
+    r"connect\.facebook\.net/.+/(fbevents|sdk)\.js", r"facebook\.com/tr[/?]",
+    r"/ajax/bz\b", r"/ajax/bnzai\b", r"/ajax/webstorage/process_keys", r"/ajax/qm/",
+    r"\.(mp4|webm|m3u8|woff2?|ttf|otf)(\?|$)",
+]
+
+# Rough transfer size of what gets blocked (bytes); blocked requests are never
+# fetched, so the "avoided" figure is an estimate by resource type.
+EST_BYTES_BY_TYPE = {"font": 60_000, "media": 400_000, "script": 90_000, "image": 40_000,
+                     "xhr": 2_000, "fetch": 2_000, "texttrack": 5_000, "manifest": 2_000}
+
+NO_ANIMATIONS_JS = """
+(() => {
+  const css = '*,*::before,*::after{animation:none!important;transition:none!important;scroll-behavior:auto!important}';
+  const add = () => { const s = document.createElement('style'); s.textContent = css;
+                      (document.head || document.documentElement).appendChild(s); };
+  if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', add); else add();
+})();
+"""
+
+class LeanProfile:
+    """Settings for lean mode: headless launch plus request blocking."""
+    def __init__(self, *, headless: bool = True, block_types=None, block_patterns=None,
+                 disable_animations: bool = True):
+        self.headless = headless
+        self.block_types = set(BLOCKED_RESOURCE_TYPES if block_types is None else block_types)
+        self.block_patterns = list(BLOCKED_URL_PATTERNS if block_patterns is None else block_patterns)
+        self.disable_animations = disable_animations
+
+    def launch_options(self) -> dict:
+        return {"headless": self.headless, "reduced_motion": "reduce"} if self.disable_animations else {"headless": self.headless}
+
+class LeanMode:
+    """
+    Installs the blocking route on one browser context and counts what it saved.
+    Counters cover one listing: call reset() when a listing starts and report()
+    when it ends.
+    """
+    def __init__(self, profile: LeanProfile):
+        self.profile = profile
+        self._url_re = re.compile("|".join(profile.block_patterns), re.I) if profile.block_patterns else None
+        self.reset()
+
+    def reset(self):
+        self.blocked = Counter()
+        self.bytes_avoided = 0
+        self.requests_loaded = 0
+        self.bytes_loaded = 0
+
+    async def apply(self, context):
+        await context.route("**/*", self._route)
+        context.on("response", self._on_response)
+        if self.profile.disable_animations:
+            await context.add_init_script(NO_ANIMATIONS_JS)
+
+    async def _route(self, route):
+        req = route.request
+        rtype = req.resource_type
+        if req.url.startswith(("data:", "blob:")):
+            await route.continue_()
+        elif rtype in self.profile.block_types or (self._url_re and self._url_re.search(req.url)):
+            self.blocked[rtype] += 1
+            self.bytes_avoided += EST_BYTES_BY_TYPE.get(rtype, 5_000)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        self.requests_loaded += 1
+        try:
+            self.bytes_loaded += int(response.headers.get("content-length") or 0)
+        except:
+            pass
+
+    def report(self) -> dict:
+        return {
+            "requests_blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "bytes_avoided_est": self.bytes_avoided,
+            "requests_loaded": self.requests_loaded,
+            "bytes_loaded": self.bytes_loaded,
+        }
+
+    def format_report(self) -> str:
+        r = self.report()
+        return (f"Lean: blocked {r['requests_blocked']} request(s) (~{r['bytes_avoided_est'] // 1024} KB avoided), "
+                f"loaded {r['requests_loaded']} ({r['bytes_loaded'] // 1024} KB)")
@@ -0,0 +1,311 @@
+﻿# marketplace_standin.py
+"""
+Local stand-in for the Marketplace vehicle composer, used to benchmark
+SimpleFacebookPoster without touching facebook.com.
+
+Serves:
+  /                               home page (goto_facebook)
+  /marketplace/create/vehicle     composer: vehicle-type dropdown, comboboxes,
+                                  contenteditable description, file input,
+                                  Next -> groups dialog -> Publish
+  /marketplace/item/<id>          listing page with Mark as sold / Delete listing
+  /images/<name>.jpg              generated JPEGs for listing image URLs
+  POST /upload, /api/publish, /api/sold/<id>, /api/delete/<id>
+
+DOM variants:
+  aria         fields carry aria-label (matches the first locator candidates)
+  placeholder  no labels, placeholders only (forces later candidates)
+  direct       like aria, but Publish sits on the page (no Next/groups dialog)
+
+Run stand-alone:  python marketplace_standin.py --port 8765 --variant placeholder
+"""
+import argparse, hashlib, json, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+VARIANTS = ("aria", "placeholder", "direct")
+
+YEARS = [str(y) for y in range(2026, 1989, -1)]
+MAKES = ["Acura", "BMW", "Chevrolet", "Dodge", "Ford", "GMC", "Honda", "Hyundai", "Jeep", "Kia", "Mazda",
+         "Mercedes-Benz", "Nissan", "Ram", "Subaru", "Tesla", "Toyota", "Volkswagen"]
+COLORS = ["Black", "Blue", "Brown", "Gold", "Gray", "Green", "Orange", "Red", "Silver", "White", "Yellow"]
+FIELDS = [
+    ("Location", "combo", ["Surrey, BC", "Vancouver, BC", "Burnaby, BC", "Richmond, BC"]),
+    ("Year", "combo", YEARS),
+    ("Make", "combo", MAKES),
+    ("Model", "combo", []),
+    ("Mileage", "input", None),
+    ("Price", "input", None),
+    ("Body style", "combo", ["Coupe", "Truck", "Sedan", "Hatchback", "SUV", "Convertible", "Wagon", "Minivan"]),
+    ("Exterior color", "combo", COLORS),
+    ("Interior color", "combo", COLORS),
+    ("Vehicle condition", "combo", ["Excellent", "Very good", "Good", "Fair", "Poor"]),
+    ("Fuel type", "combo", ["Gasoline", "Diesel", "Electric", "Hybrid", "Flex"]),
+    ("Transmission", "combo", ["Automatic", "Manual"]),
+]
+VEHICLE_TYPES = ["Car/Truck", "Motorcycle", "Powersport", "RV/Camper", "Trailer", "Boat", "Commercial/Industrial", "Other"]
+
+HOME_HTML = """<!doctype html><html lang="en"><head><meta charset="utf-8"><title>Facebook</title></head>
+<body><div role="main"><h1>Home</h1><a href="/marketplace/create/vehicle">Create listing</a></div></body></html>"""
+
+COMPOSER_HTML = """<!doctype html><html lang="en"><head><meta charset="utf-8">
+<title>Marketplace - Vehicle for sale</title>
+<style>
+  body{font-family:sans-serif;margin:0} [role=main]{padding:16px;max-width:640px}
+  .field{margin:8px 0} .field input,[role=combobox],[role=textbox]{display:block;min-width:280px;padding:6px;border:1px solid #999}
+  [role=textbox]{min-height:60px} #photos img{width:80px;height:60px;object-fit:cover;margin:2px}
+  #listbox{position:absolute;background:#fff;border:1px solid #ccc;z-index:5;min-width:200px}
+  [role=option]{padding:4px 8px;cursor:pointer} [role=button],[role=switch],[role=checkbox]{display:inline-block;padding:6px 10px;border:1px solid #666;cursor:pointer;margin:4px}
+  [role=dialog]{position:fixed;top:15%;left:25%;background:#fff;border:1px solid #333;padding:16px;z-index:10}
+  .hidden{display:none!important}
+</style></head>
+<body><div role="main">
+  <h1>Vehicle for sale</h1>
+  <div id="photos"></div>
+  <div role="button" tabindex="0" id="add-photos" onclick="document.getElementById('file').click()">Add photos</div>
+  <input type="file" id="file" accept="image/*" multiple style="display:none">
+  <div class="field">__VEHICLE_TYPE__</div>
+  <div id="details" class="hidden">
+    __FIELDS__
+    <div class="field">__DESCRIPTION__</div>
+    <div class="field"><span>Hide from friends</span> <div role="switch" aria-checked="false" tabindex="0">Off</div></div>
+    __ACTIONS__
+  </div>
+</div>
+<div id="listbox" role="listbox" class="hidden"></div>
+<div role="dialog" aria-label="List in more places" class="hidden" id="groups">
+  <h2>List in more places</h2>
+  <div role="checkbox" aria-checked="true" tabindex="0">Surrey Buy &amp; Sell</div>
+  <div role="checkbox" aria-checked="true" tabindex="0">Lower Mainland Cars</div>
+  <div role="checkbox" aria-checked="false" tabindex="0">BC Auto Market</div>
+  <div><div role="button" tabindex="0" id="publish">Publish</div></div>
+</div>
+<script>
+const RENDER_MS = __RENDER_MS__;
+let dirty = false, active = null;
+const lb = document.getElementById('listbox');
+window.addEventListener('beforeunload', e => { if (dirty) { e.preventDefault(); e.returnValue = ''; } });
+function opts(el) { return (el.dataset.options || '').split('|').filter(Boolean); }
+function suggestions(el) {
+  const q = (el.value || '').trim().toLowerCase();
+  const hits = opts(el).filter(o => o.toLowerCase().includes(q));
+  return hits.length ? hits : (q ? [el.value.trim()] : opts(el));
+}
+function openList(el, items) {
+  active = el; lb.innerHTML = '';
+  items.slice(0, 8).forEach(v => {
+    const o = document.createElement('div'); o.setAttribute('role', 'option'); o.textContent = v;
+    o.addEventListener('mousedown', e => { e.preventDefault(); choose(el, v); });
+    lb.appendChild(o);
+  });
+  const r = el.getBoundingClientRect();
+  lb.style.left = (r.left + window.scrollX) + 'px'; lb.style.top = (r.bottom + window.scrollY) + 'px';
+  lb.classList.toggle('hidden', !items.length); el.setAttribute('aria-expanded', String(!!items.length));
+}
+function closeList() { lb.classList.add('hidden'); if (active) active.setAttribute('aria-expanded', 'false'); active = null; }
+function choose(el, v) {
+  if (el.tagName === 'INPUT') el.value = v; else el.textContent = v;
+  el.dataset.value = v; closeList(); dirty = true;
+  if (el.id === 'vehicle-type') setTimeout(() => document.getElementById('details').classList.remove('hidden'), RENDER_MS);
+}
+document.addEventListener('click', e => {
+  const cb = e.target.closest('[role=combobox]');
+  if (cb) { openList(cb, cb.tagName === 'INPUT' ? suggestions(cb) : opts(cb)); return; }
+  if (!e.target.closest('#listbox')) closeList();
+  const sw = e.target.closest('[role=switch],[role=checkbox]');
+  if (sw) sw.setAttribute('aria-checked', String(sw.getAttribute('aria-checked') !== 'true'));
+});
+document.addEventListener('input', e => {
+  dirty = true;
+  const cb = e.target.closest('input[role=combobox]'); if (cb) openList(cb, suggestions(cb));
+});
+document.addEventListener('keydown', e => {
+  if (e.key !== 'Enter' || !active) return;
+  e.preventDefault();
+  const first = lb.querySelector('[role=option]'); if (first) choose(active, first.textContent); else closeList();
+});
+document.getElementById('file').addEventListener('change', e => {
+  for (const f of e.target.files) {
+    fetch('/upload', {method: 'POST', body: f}).then(r => r.json()).then(() => {
+      const img = document.createElement('img'); img.src = URL.createObjectURL(f);
+      document.getElementById('photos').appendChild(img);
+    });
+  }
+});
+const nextBtn = document.getElementById('next');
+if (nextBtn) nextBtn.addEventListener('click', () => setTimeout(() => document.getElementById('groups').classList.remove('hidden'), RENDER_MS));
+document.querySelectorAll('#publish').forEach(b => b.addEventListener('click', async () => {
+  const data = {};
+  document.querySelectorAll('[data-field]').forEach(el => data[el.dataset.field] = el.value || el.textContent);
+  data.groups = [...document.querySelectorAll('#groups [role=checkbox][aria-checked=true]')].map(c => c.textContent);
+  data.photos = document.querySelectorAll('#photos img').length;
+  const r = await fetch('/api/publish', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(data)});
+  const j = await r.json(); dirty = false;
+  location.assign('/marketplace/item/' + j.id);
+}));
+</script></body></html>"""
+
+ITEM_HTML = """<!doctype html><html lang="en"><head><meta charset="utf-8"><title>Marketplace listing __ID__</title></head>
+<body><div role="main">
+  <h1>Listing __ID__</h1><p id="state">Your listing is live</p>
+  <div role="button" tabindex="0" id="sold">Mark as sold</div>
+  <div role="button" tabindex="0" id="del">Delete listing</div>
+</div>
+<div role="dialog" class="hidden" id="confirm" style="display:none"><h2>Delete listing?</h2>
+  <div role="button" tabindex="0" id="confirm-del">Delete</div></div>
+<script>
+const state = document.getElementById('state');
+document.getElementById('sold').onclick = () => fetch('/api/sold/__ID__', {method: 'POST'}).then(() => state.textContent = 'Sold');
+const dlg = document.getElementById('confirm');
+document.getElementById('del').onclick = () => { dlg.style.display = 'block'; };  // trigger stays behind the modal
+document.getElementById('confirm-del').onclick = () => fetch('/api/delete/__ID__', {method: 'POST'}).then(() => {
+  dlg.remove(); state.textContent = 'Deleted'; });
+</script></body></html>"""
+
+def _field_html(name: str, kind: str, options, variant: str) -> str:
+    fid = "f-" + re.sub(r"[^a-z]+", "-", name.lower()).strip("-")
+    named = f'aria-label="{name}"' if variant != "placeholder" else f'placeholder="{name}"'
+    role = 'role="combobox" aria-expanded="false" autocomplete="off"' if kind == "combo" else 'inputmode="numeric"'
+    data = f'data-options="{"|".join(options)}"' if options else ""
+    return f'<div class="field"><input id="{fid}" data-field="{name}" {role} {named} {data}></div>'
+
+def render_composer(variant: str = "aria", render_ms: int = 150) -> str:
+    if variant == "placeholder":
+        vtype = (f'<div role="combobox" id="vehicle-type" tabindex="0" aria-expanded="false" '
+                 f'data-options="{"|".join(VEHICLE_TYPES)}">Vehicle type</div>')
+        desc = '<div role="textbox" contenteditable="true" data-field="Description"></div>'
+    else:
+        vtype = (f'<div role="combobox" id="vehicle-type" tabindex="0" aria-expanded="false" aria-label="Vehicle type" '
+                 f'data-options="{"|".join(VEHICLE_TYPES)}">Select</div>')
+        desc = '<div role="textbox" contenteditable="true" aria-label="Description" data-field="Description"></div>'
+    fields = "\n    ".join(_field_html(n, k, o, variant) for n, k, o in FIELDS)
+    if variant == "direct":
+        actions = '<div role="button" tabindex="0" id="publish">Publish</div>'
+    else:
+        actions = '<div role="button" tabindex="0" id="next">Next</div>'
+    return (COMPOSER_HTML.replace("__VEHICLE_TYPE__", vtype).replace("__FIELDS__", fields)
+            .replace("__DESCRIPTION__", desc).replace("__ACTIONS__", actions)
+            .replace("__RENDER_MS__", str(int(render_ms))))
+
+def make_jpeg(name: str, size=(1024, 768)) -> bytes:
+    from PIL import Image
+    h = hashlib.md5(name.encode()).digest()
+    im = Image.new("RGB", size, (h[0], h[1], h[2]))
+    im.paste((h[3], h[4], h[5]), (size[0] // 4, size[1] // 4, size[0] * 3 // 4, size[1] * 3 // 4))
+    buf = BytesIO()
+    im.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MarketplaceStandin/1.0"
+
+    def log_message(self, *args): pass
+
+    def _send(self, code: int, body: bytes, ctype: str = "text/html; charset=utf-8"):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        st = self.server.standin
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/images/"):
+            return self._send(200, st.image(path), "image/jpeg")
+        st.delay(st.latency_ms)
+        if path in ("/", ""):
+            return self._send(200, HOME_HTML.encode())
+        if path.rstrip("/") == "/marketplace/create/vehicle":
+            return self._send(200, render_composer(st.variant, st.render_ms).encode())
+        m = re.fullmatch(r"/marketplace/item/(\d+)/?", path)
+        if m:
+            return self._send(200, ITEM_HTML.replace("__ID__", m.group(1)).encode())
+        self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        st = self.server.standin
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self.path.split("?", 1)[0]
+        if path == "/upload":
+            st.delay(st.upload_ms)
+            st.count("uploads")
+            return self._send(200, json.dumps({"ok": True, "bytes": len(body)}).encode(), "application/json")
+        st.delay(st.latency_ms)
+        if path == "/api/publish":
+            item_id = st.publish(json.loads(body or b"{}"))
+            return self._send(200, json.dumps({"id": item_id}).encode(), "application/json")
+        m = re.fullmatch(r"/api/(sold|delete)/(\d+)", path)
+        if m:
+            st.count(m.group(1))
+            return self._send(200, b'{"ok": true}', "application/json")
+        self._send(404, b"not found", "text/plain")
+
+class MarketplaceStandin:
+    """Threaded local HTTP server; url is set once start() returns."""
+    def __init__(self, host="127.0.0.1", port=0, *, variant="aria", latency_ms=50, render_ms=150, upload_ms=200):
+        if variant not in VARIANTS:
+            raise ValueError(f"variant must be one of {', '.join(VARIANTS)}")
+        self.variant = variant
+        self.latency_ms = latency_ms
+        self.render_ms = render_ms
+        self.upload_ms = upload_ms
+        self.published: dict[int, dict] = {}
+        self.counters = {"uploads": 0, "publish": 0, "sold": 0, "delete": 0}
+        self._images: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._next_id = 100000
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self._thread = None
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="marketplace-standin")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @staticmethod
+    def delay(ms: int):
+        if ms: time.sleep(ms / 1000)
+
+    def count(self, key: str):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def publish(self, data: dict) -> int:
+        with self._lock:
+            self._next_id += 1
+            self.published[self._next_id] = data
+            self.counters["publish"] += 1
+            return self._next_id
+
+    def image(self, path: str) -> bytes:
+        with self._lock:
+            if path not in self._images:
+                self._images[path] = make_jpeg(path)
+            return self._images[path]
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the offline Marketplace composer stand-in")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--variant", choices=VARIANTS, default="aria")
+    ap.add_argument("--latency-ms", type=int, default=50)
+    ap.add_argument("--render-ms", type=int, default=150)
+    ap.add_argument("--upload-ms", type=int, default=200)
+    args = ap.parse_args()
+    st = MarketplaceStandin(port=args.port, variant=args.variant, latency_ms=args.latency_ms,
+                            render_ms=args.render_ms, upload_ms=args.upload_ms).start()
+    print(f"Marketplace stand-in ({args.variant}) on {st.url} - Ctrl+C to stop")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        st.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+﻿# playwright_runtime.py
+import asyncio
+
+from playwright.async_api import async_playwright
+
+class PlaywrightRuntime:
+    """
+    Process-wide owner of the Playwright driver.
+    The Node driver is started once per event loop (async Playwright objects are
+    loop-bound) and handed to every poster and pool running on that loop;
+    shutdown() stops it again. Live drivers/contexts/pages are counted so leaks
+    show up in stats().
+    """
+    def __init__(self):
+        self._drivers = {}   # event loop -> started Playwright
+        self._locks = {}     # event loop -> asyncio.Lock guarding start/stop
+        self._counts = {}    # event loop -> {"contexts": n, "pages": n}
+        self.drivers_started = 0
+
+    def log(self, msg: str): print(f"[runtime] {msg}")
+
+    def _lock(self):
+        return self._locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+
+    async def get(self):
+        """Return the Playwright driver for the running loop, starting it on first use."""
+        loop = asyncio.get_running_loop()
+        pw = self._drivers.get(loop)
+        if pw is not None:
+            return pw
+        async with self._lock():
+            if loop not in self._drivers:
+                self._drivers[loop] = await async_playwright().start()
+                self.drivers_started += 1
+                self.log(f"Playwright driver started ({len(self._drivers)} live)")
+            return self._drivers[loop]
+
+    async def launch_persistent_context(self, user_data_dir: str, **kwargs):
+        pw = await self.get()
+        context = await pw.chromium.launch_persistent_context(user_data_dir=user_data_dir, **kwargs)
+        self.track_context(context)
+        return context
+
+    async def shutdown(self):
+        """Stop the driver owned by the running loop (contexts it launched die with it)."""
+        loop = asyncio.get_running_loop()
+        async with self._lock():
+            pw = self._drivers.pop(loop, None)
+            if pw is None:
+                return
+            try:
+                await pw.stop()
+            except Exception as e:
+                self.log(f"Driver stop failed: {e}")
+        self._locks.pop(loop, None)
+        self._counts.pop(loop, None)  # everything the driver owned is gone now
+        self.log(f"Playwright driver stopped; {self.format_stats()}")
+
+    # ---------- counters ----------
+    def _loop_counts(self) -> dict:
+        return self._counts.setdefault(asyncio.get_running_loop(), {"contexts": 0, "pages": 0})
+
+    def track_context(self, context):
+        counts = self._loop_counts()
+        counts["contexts"] += 1
+        context.on("close", lambda _: _dec(counts, "contexts"))
+        context.on("page", lambda page: self._track_page(counts, page))
+        for page in context.pages:
+            self._track_page(counts, page)
+
+    def _track_page(self, counts: dict, page):
+        counts["pages"] += 1
+        page.on("close", lambda _: _dec(counts, "pages"))
+
+    def stats(self) -> dict:
+        return {
+            "drivers": len(self._drivers),
+            "drivers_started": self.drivers_started,
+            "contexts": sum(c["contexts"] for c in self._counts.values()),
+            "pages": sum(c["pages"] for c in self._counts.values()),
+        }
+
+    def format_stats(self) -> str:
+        st = self.stats()
+        return f"drivers={st['drivers']} contexts={st['contexts']} pages={st['pages']}"
+
+def _dec(counts: dict, key: str):
+    counts[key] = max(0, counts[key] - 1)
+
+runtime = PlaywrightRuntime()
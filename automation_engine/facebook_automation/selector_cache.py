@@ -0,0 +1,78 @@
+﻿# selector_cache.py
+import json, os, time
+from pathlib import Path
+
+class SelectorCache:
+    """
+    Remembers which candidate locator resolved each logical field (Year, Make,
+    Publish button, ...) for one account, per UI locale, so the winner is tried
+    first next time.
+
+    File: account-instances/<account>/selector-cache.json
+      {"<locale>": {"<field>": {"index": 3, "count": 10, "hits": 12, "updated": 1700000000}}}
+
+    An entry invalidates itself when the candidate list for the field changes
+    size, or when the remembered candidate stops resolving (DOM changed).
+    Only the fields this instance changed are written back, merged into the file
+    as it is at save time, so posters of the same account don't drop each other's.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.locale = "default"
+        self._changes = {}  # (locale, field) -> entry, None when forgotten
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except:
+            return {}
+
+    def set_locale(self, locale: str | None):
+        self.locale = (locale or "default").strip() or "default"
+
+    def _fields(self) -> dict:
+        return self._data.setdefault(self.locale, {})
+
+    def winner(self, field: str, count: int) -> int | None:
+        e = self._fields().get(field)
+        if not e: return None
+        if e.get("count") != count or not (0 <= e.get("index", -1) < count):
+            self.forget(field)
+            return None
+        return e["index"]
+
+    def order(self, field: str, count: int) -> list[int]:
+        """Candidate indexes to try, remembered winner first."""
+        w = self.winner(field, count)
+        rest = [i for i in range(count) if i != w]
+        return ([w] + rest) if w is not None else rest
+
+    def hit(self, field: str, index: int, count: int):
+        e = self._fields().get(field)
+        if e and e.get("index") == index and e.get("count") == count:
+            e["hits"] = e.get("hits", 0) + 1
+        else:
+            self._fields()[field] = {"index": index, "count": count, "hits": 1}
+        self._fields()[field]["updated"] = int(time.time())
+        self._changes[(self.locale, field)] = self._fields()[field]
+
+    def forget(self, field: str):
+        if self._fields().pop(field, None) is not None:
+            self._changes[(self.locale, field)] = None
+
+    def save(self):
+        if not self._changes: return
+        try:
+            data = self._load()
+            for (locale, field), e in self._changes.items():
+                if e is None: data.get(locale, {}).pop(field, None)
+                else: data.setdefault(locale, {})[field] = e
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}-{id(self)}.tmp")
+            tmp.write_text(json.dumps(data, indent=1, sort_keys=True), encoding="utf-8")
+            tmp.replace(self.path)
+            self._data, self._changes = data, {}
+        except Exception as e:
+            print(f"[selector-cache] save failed: {e}")
@@ -0,0 +1,75 @@
+﻿# step_timer.py
+import functools, json, time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+class Span:
+    __slots__ = ("step", "started_at", "duration_ms", "outcome", "candidate", "error")
+
+    def __init__(self, step: str):
+        self.step = step
+        self.started_at = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        self.duration_ms = None
+        self.outcome = "ok"
+        self.candidate = None  # index of the locator candidate that matched, if any
+        self.error = None
+
+    def result(self, ok):
+        """Marks the span failed when `ok` is falsy; returns `ok` unchanged."""
+        if not ok: self.outcome = "fail"
+        return ok
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class StepTimer:
+    """
+    Collects timed spans for one posting attempt.
+      with timer.span("upload_images") as sp: sp.result(await ...)
+    Nested spans are allowed; note_candidate() tags the innermost open span.
+    """
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._open: list[Span] = []
+
+    @contextmanager
+    def span(self, step: str):
+        sp = Span(step)
+        self._open.append(sp)
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as e:
+            sp.outcome = "error"
+            sp.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            sp.duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+            self._open.remove(sp)
+            self.spans.append(sp)
+
+    def note_candidate(self, index: int):
+        if self._open: self._open[-1].candidate = index
+
+    def write_jsonl(self, path: Path, **context):
+        """Appends one JSON line per span, each carrying `context` (listing, account, ...)."""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for sp in self.spans:
+                    f.write(json.dumps({**context, **sp.to_dict()}) + "\n")
+        except Exception as e:
+            print(f"[timer] could not write {path}: {e}")
+
+def timed(step: str):
+    """Decorator for poster coroutines: one span per call, failed when the result is falsy."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            with self.timer.span(step) as sp:
+                result = await fn(self, *args, **kwargs)
+                sp.result(result[0] if isinstance(result, tuple) else result)
+                return result
+        return wrapper
+    return deco
@@ -0,0 +1,279 @@
+﻿# csv_import.py
+import csv, hashlib, io, itertools, json, sqlite3, time
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+REQUIRED = ["platform", "title", "vehicleType", "make", "model", "year", "mileage", "price", "description", "location"]
+
+# listings column <- CSV header, default when the header is missing or the cell is empty
+FIELDS = [
+    ("platform", "platform", "facebook"),
+    ("title", "title", ""),
+    ("vehicle_type", "vehicleType", "Car/Truck"),
+    ("make", "make", ""),
+    ("model", "model", ""),
+    ("year", "year", ""),
+    ("mileage", "mileage", ""),
+    ("price", "price", ""),
+    ("body_style", "bodyStyle", ""),
+    ("color_ext", "colorExt", ""),
+    ("color_int", "colorInt", ""),
+    ("condition", "condition", ""),
+    ("fuel", "fuel", ""),
+    ("transmission", "transmission", ""),
+    ("description", "description", ""),
+    ("location", "location", ""),
+    ("stock_type", "stock_type", None),
+    ("week_price", "week_price", None),
+    ("title_status", "titleStatus", None),
+    ("groups", "groups", None),
+    ("hide_from_friends", "hideFromFriends", "0"),
+]
+KEY_HEADERS = ("id", "vin", "VIN")  # first non-empty one becomes listings.external_id
+CONTENT = [col for col, _, _ in FIELDS] + ["images", "images_json"]  # what row_hash covers
+COLUMNS = ["campaign_id", "external_id"] + CONTENT + ["row_hash", "status"]
+INSERT_SQL = f"INSERT INTO listings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+UPDATE_SQL = f"UPDATE listings SET {', '.join(c + '=?' for c in CONTENT)}, row_hash=? WHERE id=?"
+IMAGE_COLUMNS = {"images", "images_json"}
+CACHE_COLUMNS = ["images_cached_dir", "images_cached_json", "image_rejects_json"]  # cleared when photos change
+RESTORE_SQL = f"UPDATE listings SET {', '.join(c + '=?' for c in CONTENT + ['row_hash'] + CACHE_COLUMNS)} WHERE id=?"
+
+ENGINES = ("auto", "csv", "arrow")
+MODES = ("append", "upsert")
+
+def now_utc(): return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def external_key(row: dict) -> str | None:
+    return next((str(row[h]).strip() for h in KEY_HEADERS if row.get(h) and str(row[h]).strip()), None)
+
+def content(row: dict) -> tuple:
+    """One CSV row (header -> text) as the values of CONTENT."""
+    images_json = None
+    if row.get("images_json"):
+        try: images_json = json.dumps(json.loads(row["images_json"]))
+        except: images_json = None
+    return tuple(row.get(key) or default for _, key, default in FIELDS) + (row.get("images") or "", images_json)
+
+def row_hash(values: tuple) -> str:
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def normalize(row: dict, campaign_id: int) -> tuple:
+    """One CSV row as the INSERT_SQL parameters."""
+    values = content(row)
+    return (campaign_id, external_key(row)) + values + (row_hash(values), "pending")
+
+def insert_rows(conn, rows: list[tuple]) -> tuple[int, int] | None:
+    """
+    Inserts INSERT_SQL rows and returns the (first, last) listing id they got. The
+    transaction holds the write lock from the first insert on, so AUTOINCREMENT hands
+    this batch consecutive ids that no concurrent import can share.
+    """
+    if not rows: return None
+    conn.executemany(INSERT_SQL, rows)
+    last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='listings'").fetchone()[0]
+    return last - len(rows) + 1, last
+
+def check_header(fieldnames, mode: str = "append"):
+    missing = [h for h in REQUIRED if h not in (fieldnames or [])]
+    if missing: raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if mode == "upsert" and not set(KEY_HEADERS) & set(fieldnames):
+        raise ValueError(f"Updating a campaign needs a vehicle key column ({' or '.join(KEY_HEADERS[:2])})")
+
+# ---------- row sources: both yield lists of header -> text dicts ----------
+def csv_batches(stream, batch_size: int):
+    """Decodes the binary upload incrementally (csv module); yields header first, then row batches."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        rdr = csv.DictReader(text)
+        yield rdr.fieldnames
+        while batch := list(itertools.islice(rdr, batch_size)):
+            yield batch
+    finally:
+        text.detach()  # leave the caller's file open
+
+def arrow_batches(stream, batch_size: int):
+    """
+    Same as csv_batches through pyarrow's streaming CSV reader (C parser, no Python per
+    row). Dealer descriptions carry quoted line breaks, and newlines_in_values makes
+    pyarrow parse each block serially instead of on its thread pool; correct rows
+    matter more here. cli/check_csv_engines.py checks both sources agree.
+    """
+    if pa_csv is None: raise RuntimeError("pyarrow is not installed; use engine='csv'")
+    header = next(csv.reader([stream.readline().decode("utf-8-sig")]), [])
+    yield header
+    reader = pa_csv.open_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(column_names=header, block_size=4 << 20),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        # every column stays text, as with the csv module; no type inference per block
+        convert_options=pa_csv.ConvertOptions(column_types={h: pa.string() for h in header},
+                                              strings_can_be_null=False))
+    pending = []
+    for rb in reader:
+        pending.extend(rb.to_pylist())
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            pending = pending[batch_size:]
+    if pending: yield pending
+
+# ---------- incremental re-import ----------
+def _same(a, b) -> bool:
+    return (a if a is None else str(a)) == (b if b is None else str(b))
+
+class Upsert:
+    """
+    mode="upsert" state for one import: the campaign's listings by external_id and
+    what the feed did to them. Rows whose row_hash matches are not written at all;
+    with dry_run nothing is. The previous values of updated rows are kept for undo().
+    """
+    def __init__(self, conn, campaign_id: int | None, dry_run: bool = False):
+        self.campaign_id = campaign_id
+        self.dry_run = dry_run
+        self.known = {}  # external_id -> (listing id, row_hash); the oldest row wins if a key repeats
+        for lid, key, h in conn.execute("""
+          SELECT id, external_id, row_hash FROM listings WHERE campaign_id=? AND external_id IS NOT NULL ORDER BY id
+        """, (campaign_id,)):
+            self.known.setdefault(key, (lid, h))
+        self.seen = set()
+        self.counts = dict.fromkeys(("new", "changed", "unchanged", "unkeyed", "duplicate"), 0)
+        self.changed = []  # {"id", "external_id", "fields"}
+        self.added = []    # external ids of new vehicles
+        self.previous = [] # RESTORE_SQL parameters of the rows this import updated
+
+    def apply(self, conn, rows: list[dict]):
+        inserts = []
+        for r in rows:
+            key, values = external_key(r), content(r)
+            h = row_hash(values)
+            if key is not None and key in self.seen:
+                self.counts["duplicate"] += 1; continue
+            known = self.known.get(key) if key is not None else None
+            if known is None:
+                self.counts["new" if key is not None else "unkeyed"] += 1
+                if key is not None: self.seen.add(key); self.added.append(key)
+                inserts.append((self.campaign_id, key) + values + (h, "pending")); continue
+            self.seen.add(key)
+            lid, old_hash = known
+            if old_hash == h:
+                self.counts["unchanged"] += 1; continue
+            old = conn.execute(f"SELECT {', '.join(CONTENT + ['row_hash'] + CACHE_COLUMNS)} FROM listings WHERE id=?",
+                               (lid,)).fetchone()
+            fields = [col for col, a, b in zip(CONTENT, old, values) if not _same(a, b)]
+            if not fields:  # row from before row_hash existed, same content
+                if not self.dry_run: conn.execute("UPDATE listings SET row_hash=? WHERE id=?", (h, lid))
+                self.counts["unchanged"] += 1; continue
+            self.counts["changed"] += 1
+            self.changed.append({"id": lid, "external_id": key, "fields": fields})
+            if self.dry_run: continue
+            self.previous.append(tuple(old) + (lid,))
+            conn.execute(UPDATE_SQL, values + (h, lid))
+            if IMAGE_COLUMNS & set(fields):  # cached copies are of the old photos
+                conn.execute("""
+                  UPDATE listings SET images_cached_dir=NULL, images_cached_json=NULL, image_rejects_json=NULL
+                  WHERE id=?
+                """, (lid,))
+        if inserts and not self.dry_run: return insert_rows(conn, inserts)
+        return None
+
+    def undo(self, conn):
+        """Puts the rows this import updated back as they were."""
+        conn.executemany(RESTORE_SQL, self.previous)
+
+    def summary(self) -> dict:
+        vanished = [{"id": lid, "external_id": key} for key, (lid, _) in self.known.items() if key not in self.seen]
+        return {**self.counts, "vanished": len(vanished), "new_listings": self.added,
+                "changed_listings": self.changed, "vanished_listings": vanished}
+
+# ---------- import ----------
+def import_csv(db, campaign_name: str, stream, *, mode: str = "append", engine: str = "auto",
+               batch_size: int = 5000, progress_every: int = 50_000, dry_run: bool = False, log=print) -> dict:
+    """
+    Streams a CSV upload (binary file object) into listings under campaign_name.
+
+    Rows are normalized a batch at a time and inserted with executemany, one
+    transaction per batch, so the write lock is held for a batch, not the whole
+    feed, and the dashboard and posting runs keep writing in between. If the import
+    fails part-way, the rows it already inserted (and a campaign it created) are
+    deleted again; rows of other imports running at the same time are left alone.
+
+    mode "upsert" re-imports a feed into an existing campaign: rows are matched on
+    external_id (the feed's id or VIN column) and only new or changed vehicles are
+    written; the report adds new/changed/unchanged/vanished counts, the new external
+    ids and the changed (with field names) and vanished listings. Vanished listings
+    are left as they are. If the import fails, the rows it updated get their previous
+    values back. dry_run=True only reports what an upsert would do.
+
+    engine "arrow" parses with pyarrow, "auto" uses it when installed.
+    Returns {"campaign_id", "rows", "seconds", "rows_per_sec", "engine", "mode", ...}.
+    """
+    if mode not in MODES: raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    if dry_run and mode != "upsert": raise ValueError("dry_run needs mode='upsert'")
+    if engine not in ENGINES: raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    if engine == "auto": engine = "arrow" if pa_csv is not None else "csv"
+    batches = (arrow_batches if engine == "arrow" else csv_batches)(stream, batch_size)
+    conn = None
+    try:
+        check_header(next(batches), mode)
+        conn = db.connect()
+        row = conn.execute("SELECT id FROM campaigns WHERE campaign_name=?", (campaign_name,)).fetchone()
+        created = not row and not dry_run
+        if row:
+            campaign_id = row[0]
+        elif dry_run:
+            campaign_id = None
+        else:
+            try:
+                campaign_id = conn.execute("INSERT INTO campaigns (campaign_name, status, created_at) VALUES (?, ?, ?)",
+                                           (campaign_name, "active", now_utc())).lastrowid
+            except sqlite3.IntegrityError:  # another import created it first (campaign_name is unique)
+                campaign_id = conn.execute("SELECT id FROM campaigns WHERE campaign_name=?",
+                                           (campaign_name,)).fetchone()[0]
+                created = False
+        upsert = Upsert(conn, campaign_id, dry_run) if mode == "upsert" else None
+        conn.commit()
+
+        t0 = time.perf_counter()
+        rows = next_report = 0
+        inserted = []  # (first, last) listing ids of each committed batch
+        try:
+            for batch in batches:
+                if upsert: ids = upsert.apply(conn, batch)
+                else: ids = insert_rows(conn, [normalize(r, campaign_id) for r in batch])
+                conn.commit()
+                if ids: inserted.append(ids)
+                rows += len(batch)
+                if rows >= next_report + progress_every:
+                    next_report = rows - rows % progress_every
+                    log(f"[import] {campaign_name}: {rows:,} rows ({rows / (time.perf_counter() - t0):,.0f} rows/s)")
+        except BaseException:
+            conn.rollback()
+            conn.executemany("DELETE FROM listings WHERE campaign_id=? AND id BETWEEN ? AND ?",
+                             [(campaign_id, lo, hi) for lo, hi in inserted])
+            if upsert: upsert.undo(conn)
+            if created:  # unless a concurrent import has since added rows to it
+                conn.execute("DELETE FROM campaigns WHERE id=? AND NOT EXISTS (SELECT 1 FROM listings WHERE campaign_id=?)",
+                             (campaign_id, campaign_id))
+            conn.commit()
+            raise
+        seconds = time.perf_counter() - t0
+    finally:
+        batches.close()
+        if conn is not None: conn.close()
+    report = {"campaign_id": campaign_id, "rows": rows, "seconds": round(seconds, 3),
+              "rows_per_sec": round(rows / seconds) if seconds else rows, "engine": engine, "mode": mode, "dry_run": dry_run}
+    log(f"[import] {campaign_name}: {rows:,} rows in {seconds:.1f}s ({report['rows_per_sec']:,} rows/s, {engine})")
+    if upsert:
+        report.update(upsert.summary())
+        log(f"[import] {campaign_name}: {format_summary(report)}")
+    return report
+
+def format_summary(r: dict) -> str:
+    s = f"{r['new']} new, {r['changed']} changed, {r['unchanged']} unchanged, {r['vanished']} vanished"
+    if r["unkeyed"]: s += f", {r['unkeyed']} without id/VIN (added)"
+    if r["duplicate"]: s += f", {r['duplicate']} repeated id(s) skipped"
+    return s
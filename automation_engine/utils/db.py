@@ -0,0 +1,138 @@
+﻿# db.py
+import atexit, sqlite3, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers never block the writer and vice versa
+    "PRAGMA synchronous=NORMAL",    # safe with WAL; fsync at checkpoints only
+    "PRAGMA cache_size=-16000",     # 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=67108864",
+)
+
+class PooledConnection:
+    """
+    sqlite3.Connection stand-in handed out by Database.connect(). Everything is
+    forwarded to the real connection; close() hands it back to the pool instead
+    of closing it (an unfinished transaction is rolled back first).
+    """
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn, pool):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    def __getattr__(self, name):
+        if self._conn is None: raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)  # commit / rollback like sqlite3; stays checked out
+
+    def close(self):
+        conn = self._conn
+        if conn is None: return
+        object.__setattr__(self, "_conn", None)
+        self._pool._checkin(conn)
+
+    def __del__(self):
+        try: self.close()
+        except: pass
+
+class Database:
+    """
+    Shared, thread-safe pool of SQLite connections for one database file.
+
+    Every connection runs in WAL mode with a busy_timeout, so the dashboard, the
+    browser-loop runs and CLI processes wait for each other instead of failing
+    with "database is locked". Connections are reused, and with them sqlite3's
+    per-connection prepared-statement cache (`cached_statements`), so the same
+    UPDATE/SELECT issued per listing is parsed once per connection, not per call.
+
+      conn = db.connect(); ...; conn.close()          # close() returns it to the pool
+      with db.session() as conn: conn.execute(...)    # commit on success, rollback on error
+    """
+    def __init__(self, path: Path, *, max_idle: int = 8, busy_timeout_ms: int = 10_000, cached_statements: int = 256):
+        self.path = Path(path)
+        self.max_idle = max_idle
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        for p in PRAGMAS:
+            conn.execute(p)
+        self.opened += 1
+        return conn
+
+    def connect(self, row_factory=None) -> PooledConnection:
+        """A connection for the calling thread until close(); optional row_factory (e.g. sqlite3.Row)."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None: self.reused += 1
+        if conn is None: conn = self._open()
+        conn.row_factory = row_factory
+        return PooledConnection(conn, self)
+
+    def _checkin(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction: conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            conn.close(); return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn); return
+        conn.close()
+
+    @contextmanager
+    def session(self, row_factory=sqlite3.Row):
+        conn = self.connect(row_factory)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try: conn.close()
+            except: pass
+
+    def stats(self) -> dict:
+        return {"path": str(self.path), "opened": self.opened, "reused": self.reused, "idle": len(self._idle)}
+
+_databases: dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+def database(path) -> Database:
+    """The process-wide Database for `path` (created on first use)."""
+    key = str(Path(path).resolve())
+    with _databases_lock:
+        if key not in _databases: _databases[key] = Database(path)
+        return _databases[key]
+
+@atexit.register
+def _close_databases():
+    # closing the last connection checkpoints the WAL back into the main file
+    for db in list(_databases.values()):
+        db.close_all()
@@ -0,0 +1,340 @@
+﻿# schema.py
+import sqlite3, threading
+
+# Canonical schema of crazy_poster.db. Columns are listed in table order; every
+# declaration except the primary key must be valid for ALTER TABLE ... ADD COLUMN,
+# so a table created by any older code path can be brought up to date in place;
+# uniqueness is declared with unique indexes in INDEXES for the same reason.
+TABLES = {
+    "accounts": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("account_name", "TEXT"),
+        ("facebook_email", "TEXT"),
+        ("folder_path", "TEXT"),
+        ("status", "TEXT DEFAULT 'inactive'"),
+        ("chrome_port", "INTEGER"),
+        ("created_at", "TIMESTAMP"),
+        ("last_activity", "TIMESTAMP"),
+        ("total_posts", "INTEGER DEFAULT 0"),
+        ("failed_posts", "INTEGER DEFAULT 0"),
+    ],
+    "campaigns": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("campaign_name", "TEXT"),
+        ("csv_filename", "TEXT"),
+        ("upload_date", "TIMESTAMP"),
+        ("total_listings", "INTEGER DEFAULT 0"),
+        ("assigned_accounts", "TEXT"),      # JSON array of account IDs
+        ("status", "TEXT"),
+        ("created_at", "TEXT"),
+        ("next_run_at", "TEXT"),
+        ("publish_by_default", "INTEGER DEFAULT 0"),
+    ],
+    "listings": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("campaign_id", "INTEGER REFERENCES campaigns (id)"),
+        ("stock_type", "TEXT"),
+        ("platform", "TEXT"),
+        ("title", "TEXT"),
+        ("vehicle_type", "TEXT"),
+        ("make", "TEXT"),
+        ("model", "TEXT"),
+        ("year", "TEXT"),
+        ("mileage", "TEXT"),
+        ("price", "TEXT"),
+        ("week_price", "TEXT"),
+        ("body_style", "TEXT"),
+        ("color_ext", "TEXT"),
+        ("color_int", "TEXT"),
+        ("condition", "TEXT"),
+        ("fuel", "TEXT"),
+        ("transmission", "TEXT"),
+        ("title_status", "TEXT"),
+        ("description", "TEXT"),
+        ("location", "TEXT"),
+        ("images", "TEXT"),
+        ("images_json", "TEXT"),
+        ("groups", "TEXT"),                 # JSON array of Facebook groups
+        ("hide_from_friends", "INTEGER DEFAULT 0"),
+        ("external_id", "TEXT"),            # dealer feed id (or VIN) that re-imports match on
+        ("row_hash", "TEXT"),               # hash of the feed row's content (csv_import.row_hash)
+        ("created_at", "TIMESTAMP"),
+        ("status", "TEXT"),
+        ("post_attempts", "INTEGER"),
+        ("last_posted_at", "TEXT"),
+        ("fb_listing_url", "TEXT"),
+        ("images_cached_dir", "TEXT"),
+        ("images_cached_json", "TEXT"),
+        ("last_error_screenshot", "TEXT"),
+        ("image_rejects_json", "TEXT"),
+        ("scheduled_at", "TEXT"),
+        ("posted_account", "TEXT"),         # account-instances dir whose session owns the live listing
+        ("vanished_at", "TEXT"),            # when a sync took the listing down because it left the feed
+    ],
+    "posting_history": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("account_id", "INTEGER REFERENCES accounts (id)"),
+        ("listing_id", "INTEGER REFERENCES listings (id)"),
+        ("campaign_id", "INTEGER REFERENCES campaigns (id)"),
+        ("post_status", "TEXT DEFAULT 'pending'"),  # pending, posted, failed, sold
+        ("facebook_post_id", "TEXT"),
+        ("posted_at", "TIMESTAMP"),
+        ("scheduled_for", "TIMESTAMP"),
+        ("retry_count", "INTEGER DEFAULT 0"),
+        ("error_message", "TEXT"),
+        ("images_downloaded", "INTEGER DEFAULT 0"),
+        ("local_image_paths", "TEXT"),              # JSON array of local paths
+    ],
+    "posting_steps": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("listing_id", "INTEGER REFERENCES listings (id)"),
+        ("campaign_id", "INTEGER"),
+        ("account", "TEXT"),
+        ("attempt", "INTEGER"),
+        ("step", "TEXT"),            # start_browser, upload_images, field:Price, ...
+        ("started_at", "TEXT"),
+        ("duration_ms", "REAL"),
+        ("candidate", "INTEGER"),    # index of the locator candidate that matched
+        ("outcome", "TEXT"),         # ok, fail, error
+        ("error", "TEXT"),
+    ],
+    "schedules": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("account_id", "INTEGER REFERENCES accounts (id)"),
+        ("campaign_id", "INTEGER REFERENCES campaigns (id)"),
+        ("day_of_week", "TEXT"),
+        ("time_slot", "TEXT"),
+        ("is_active", "INTEGER DEFAULT 1"),
+        ("created_at", "TIMESTAMP"),
+    ],
+    "failed_posts": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("posting_history_id", "INTEGER REFERENCES posting_history (id)"),
+        ("account_id", "INTEGER REFERENCES accounts (id)"),
+        ("listing_id", "INTEGER REFERENCES listings (id)"),
+        ("failure_reason", "TEXT"),
+        ("error_screenshot", "TEXT"),
+        ("retry_scheduled_for", "TIMESTAMP"),
+        ("created_at", "TIMESTAMP"),
+    ],
+    "system_settings": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("setting_name", "TEXT"),
+        ("setting_value", "TEXT"),
+        ("updated_at", "TIMESTAMP"),
+    ],
+}
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_name ON accounts(account_name)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_email ON accounts(facebook_email)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_folder ON accounts(folder_path)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_port ON accounts(chrome_port)",
+    "CREATE INDEX IF NOT EXISTS idx_accounts_status ON accounts(status)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_campaigns_name ON campaigns(campaign_name)",
+    "CREATE INDEX IF NOT EXISTS idx_posting_history_account ON posting_history(account_id)",
+    "CREATE INDEX IF NOT EXISTS idx_posting_history_status ON posting_history(post_status)",
+    "CREATE INDEX IF NOT EXISTS idx_posting_history_scheduled ON posting_history(scheduled_for)",
+    "CREATE INDEX IF NOT EXISTS idx_posting_steps_listing ON posting_steps(listing_id)",
+    "CREATE INDEX IF NOT EXISTS idx_schedules_active ON schedules(is_active)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_system_settings_name ON system_settings(setting_name)",
+]
+
+def _create_sql(table: str, name: str | None = None) -> str:
+    cols = ",\n  ".join(f"{col} {decl}" for col, decl in TABLES[table])
+    return f"CREATE TABLE IF NOT EXISTS {name or table} (\n  {cols}\n)"
+
+def _columns(conn, table: str) -> list[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _index_name(sql: str) -> str:
+    return sql.split(" ON ")[0].split()[-1]
+
+def _create_index(conn, sql: str):
+    """Runs an INDEXES statement; a UNIQUE one over values that already repeat is created plain and reported."""
+    try:
+        conn.execute(sql)
+    except sqlite3.IntegrityError as e:
+        print(f"[schema] {_index_name(sql)}: {e}; created without UNIQUE until the duplicates are fixed")
+        conn.execute(sql.replace("UNIQUE ", "", 1))
+
+def _copy_expr(col: str, decl: str) -> str:
+    # tables from database_setup.py keep year/mileage/price as numbers; the canonical columns are
+    # TEXT, so convert explicitly to the text the app writes (an integral 18900.0 becomes "18900")
+    if not decl.startswith("TEXT"): return col
+    return (f"CASE typeof({col}) WHEN 'integer' THEN CAST({col} AS TEXT) "
+            f"WHEN 'real' THEN CASE WHEN {col}=CAST({col} AS INTEGER) THEN CAST(CAST({col} AS INTEGER) AS TEXT) "
+            f"ELSE CAST({col} AS TEXT) END ELSE {col} END")
+
+def _add_missing_columns(conn, table: str):
+    have = _columns(conn, table)
+    for col, decl in TABLES[table]:
+        if col not in have: conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+
+def _rebuild(conn, table: str):
+    """Recreates `table` with its canonical definition, keeping rows, ids and indexes."""
+    decls = dict(TABLES[table])
+    keep = [c for c in _columns(conn, table) if c in decls]
+    indexes = [r[0] for r in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (table,)).fetchall()]
+    cols = ", ".join(keep)
+    conn.execute(_create_sql(table, f"{table}__new"))
+    values = ", ".join(_copy_expr(c, decls[c]) for c in keep)
+    conn.execute(f"INSERT INTO {table}__new ({cols}) SELECT {values} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+    for sql in indexes:
+        conn.execute(sql)
+
+# ---------- migrations (index + 1 = the user_version they bring the DB to) ----------
+def _m1_canonical_tables(conn):
+    """
+    One schema for everything that used to create its own: app.ensure_schema,
+    DatabaseSetup.create_tables, post_campaign.ensure_columns and
+    scheduler.ensure_schedule_columns. Missing tables are created, missing columns added.
+    """
+    for table in TABLES:
+        if _columns(conn, table): _add_missing_columns(conn, table)
+        else: conn.execute(_create_sql(table))
+    for sql in INDEXES:
+        _create_index(conn, sql)
+
+def _m2_relax_setup_constraints(conn):
+    """
+    Tables made by database_setup.py declare NOT NULL columns the app never fills
+    (campaigns.csv_filename, listings.title, ...), so every campaign insert from the
+    dashboard failed on such a DB. Rebuild those with the canonical definition.
+    """
+    for table in TABLES:
+        if any(r[3] and not r[5] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()):
+            _rebuild(conn, table)
+
+def _m3_listing_indexes(conn):
+    """
+    Composite indexes for the per-campaign queries that used to scan all listings:
+    runs and the dashboard (campaign_id, status; covering for the dashboard counts),
+    scheduler.pick_due (campaign_id, scheduled_at) and the cache manager's pending
+    sweep (status). idx_listings_campaign is a prefix of the first one, so it goes.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_campaign_status ON listings(campaign_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_campaign_scheduled ON listings(campaign_id, scheduled_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_status ON listings(status)")
+    conn.execute("DROP INDEX IF EXISTS idx_listings_campaign")
+    conn.execute("ANALYZE listings")
+
+def _m4_feed_keys(conn):
+    """listings.row_hash for incremental re-imports, which look rows up by (campaign_id, external_id)."""
+    _add_missing_columns(conn, "listings")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_campaign_external ON listings(campaign_id, external_id)")
+
+def _m5_posted_account(conn):
+    """
+    listings.posted_account, so mark-sold/delete run in the session that owns the
+    listing. Listings already live get the account of their last posting attempt.
+    """
+    _add_missing_columns(conn, "listings")
+    conn.execute("""
+      UPDATE listings SET posted_account=(
+        SELECT s.account FROM posting_steps s WHERE s.listing_id=listings.id ORDER BY s.id DESC LIMIT 1)
+      WHERE fb_listing_url IS NOT NULL AND posted_account IS NULL
+    """)
+
+def _m6_account_keys(conn):
+    """
+    account_name, facebook_email, folder_path and chrome_port are unique again, as
+    database_setup.py declared them before the m2 rebuild dropped that (NULLs may
+    still repeat). Their unique indexes replace the plain idx_accounts_email.
+    """
+    unique = {r[1] for r in conn.execute("PRAGMA index_list(accounts)").fetchall() if r[2]}
+    for sql in INDEXES:
+        name = _index_name(sql)
+        if sql.startswith("CREATE UNIQUE") and " ON accounts(" in sql and name not in unique:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+            _create_index(conn, sql)
+
+def _m7_campaign_names(conn):
+    """
+    campaign_name is unique again, as the original app declared it: csv_import's
+    get-or-create looks campaigns up by name, and two imports racing on a new name
+    could create it twice.
+    """
+    sql = next(s for s in INDEXES if _index_name(s) == "idx_campaigns_name")
+    if "idx_campaigns_name" not in {r[1] for r in conn.execute("PRAGMA index_list(campaigns)").fetchall() if r[2]}:
+        conn.execute("DROP INDEX IF EXISTS idx_campaigns_name")
+        _create_index(conn, sql)
+
+def _m8_vanished_at(conn):
+    """
+    listings.vanished_at, so a sync only posts again the vehicles an earlier sync
+    took down for leaving the feed, not ones marked sold by hand.
+    """
+    _add_missing_columns(conn, "listings")
+
+MIGRATIONS = [
+    _m1_canonical_tables,
+    _m2_relax_setup_constraints,
+    _m3_listing_indexes,
+    _m4_feed_keys,
+    _m5_posted_account,
+    _m6_account_keys,
+    _m7_campaign_names,
+    _m8_vanished_at,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def apply(conn: sqlite3.Connection) -> tuple[int, int]:
+    """
+    Runs the migrations `conn`'s database hasn't seen yet, each in its own
+    transaction that also bumps PRAGMA user_version. Safe to race with another
+    process: the version is re-read under the write lock. Returns (from, to).
+    """
+    start = conn.execute("PRAGMA user_version").fetchone()[0]
+    if start >= SCHEMA_VERSION: return start, start
+    if conn.in_transaction: conn.commit()
+    fk = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys=OFF")  # table rebuilds must not cascade
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback(); break
+            try:
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version={version + 1}")
+                conn.commit()
+            except:
+                conn.rollback()
+                raise
+            print(f"[schema] database migrated to version {version + 1}")
+    finally:
+        if fk: conn.execute("PRAGMA foreign_keys=ON")
+    return start, SCHEMA_VERSION
+
+# ---------- per-process state: migrate once, then answer column questions from memory ----------
+_columns_by_db: dict[str, dict[str, frozenset]] = {}
+_migrate_lock = threading.Lock()
+
+def migrate(db) -> dict[str, frozenset]:
+    """
+    Brings the utils/db.py Database `db` to SCHEMA_VERSION (once per process) and
+    returns its column map {table: frozenset(columns)}.
+    """
+    key = str(db.path)
+    cached = _columns_by_db.get(key)
+    if cached is not None: return cached
+    with _migrate_lock:
+        if key not in _columns_by_db:
+            conn = db.connect()
+            try:
+                apply(conn)
+                tables = [r[0] for r in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()]
+                _columns_by_db[key] = {t: frozenset(_columns(conn, t)) for t in tables}
+            finally:
+                conn.close()
+        return _columns_by_db[key]
+
+def columns(db, table: str) -> frozenset:
+    """Column names of `table` from the cached map (migrates on first use)."""
+    return migrate(db).get(table, frozenset())